@@ -1,26 +1,48 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import flask
 import pandas as pd
 import numpy as np
-from dash import Dash, html, dcc, clientside_callback
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from dash import Dash, html, dcc, no_update
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
-import plotly.express as px
+import plotly.io as pio
 import dash_ag_grid as dag
-import pyodbc
+
+from agendador import Agendador, impressao
+from conexao import PoolConexoes, where_parametrizado
+from figuras import com_faixa, fig_area, fig_barras, fig_bolhas, fig_linhas, fig_pizza
+from classificador import ajustar_idf, matriz_termos, pesos_para, prever, selecionar_termos, tfidf, treinar
+from previsao import HORIZONTE, ajustar
+from quantis import matriz_sketches, mesclar_por, quantis
 
 # =========================
 # 1) CONEXÃO + QUERY
 # =========================
 # Nota: Ocultei a senha por segurança. Preencha novamente antes de rodar.
-conn = pyodbc.connect(
+CONN_STR = (
     "DRIVER={ODBC Driver 17 for SQL Server};"
     "SERVER=192.168.0.244,1433;"
     "DATABASE=FLUIG_COMPASA;"
     "UID=consulta;"
     "PWD=G@l@t@s2:20;" 
 )
+# pool compartilhado pelas threads do Flask (1 conexão por consulta em andamento)
+db = PoolConexoes(CONN_STR, tamanho=4, timeout_consulta=120)
 
-sql_query = """
-WITH BD_DETALHES AS (
+SQL_CHAMADOS = """
+WITH {cte_alterados}BD_DETALHES AS (
     SELECT
         *,
         ROW_NUMBER() OVER (
@@ -34,6 +56,7 @@ WITH BD_DETALHES AS (
                 [version] DESC
         ) AS rn
     FROM [FLUIG_COMPASA].[dbo].[ML001072]
+    {filtro_docs}
 ),
 UltimosProcessos AS (
     SELECT
@@ -43,8 +66,25 @@ UltimosProcessos AS (
             ORDER BY P.ASSIGN_START_DATE DESC
         ) AS Linha
     FROM TAR_PROCES P
+    {filtro_proces}
 )
-SELECT
+SELECT{colunas}
+FROM BD_DETALHES D
+LEFT JOIN PROCES_WORKFLOW PW
+    ON D.documentid = PW.NR_DOCUMENTO_CARD
+LEFT JOIN UltimosProcessos UP
+    ON UP.Linha = 1
+   AND UP.NUM_PROCES = PW.NUM_PROCES
+LEFT JOIN FDN_USERTENANT U
+    ON UP.CD_MATRICULA = U.USER_CODE COLLATE DATABASE_DEFAULT
+LEFT JOIN FDN_USER L
+    ON L.USER_ID = U.USER_ID
+WHERE D.rn = 1{filtro_where}
+ORDER BY D.documentid DESC;
+"""
+
+# colunas do snapshot: só as analíticas (filtros, contagens, SLA, grid)
+SQL_COLUNAS = """
     CASE
         WHEN PW.STATUS = 0 THEN 'ATIVO'
         WHEN PW.STATUS = 1 THEN 'CANCELADO'
@@ -55,6 +95,8 @@ SELECT
     PW.START_DATE,
     PW.END_DATE,
     D.[ID],
+    D.documentid,
+    D.[version],
     CASE
         WHEN D.[nm_tecAtual] IS NULL OR LTRIM(RTRIM(D.[nm_tecAtual])) = ''
         THEN COALESCE(L.FULL_NAME, U.LOGIN)
@@ -70,29 +112,86 @@ SELECT
     D.[lb_urgencia],
     D.[lb_impacto],
     D.[nm_atribuicao],
-    D.[descSolicitante],
-    D.[orientacao],
-    D.[solucao],
     UP.ASSIGN_START_DATE,
     UP.ASSIGN_END_DATE,
     UP.CD_MATRICULA,
     UP.IDI_STATUS,
-    UP.DSL_OBS_TAR,
     U.LOGIN,
-    COALESCE(L.FULL_NAME, U.LOGIN) AS FULL_NAME
-FROM BD_DETALHES D
-LEFT JOIN PROCES_WORKFLOW PW
-    ON D.documentid = PW.NR_DOCUMENTO_CARD
-LEFT JOIN UltimosProcessos UP
-    ON UP.Linha = 1
-   AND UP.NUM_PROCES = PW.NUM_PROCES
-LEFT JOIN FDN_USERTENANT U
-    ON UP.CD_MATRICULA = U.USER_CODE COLLATE DATABASE_DEFAULT
-LEFT JOIN FDN_USER L
-    ON L.USER_ID = U.USER_ID
-WHERE D.rn = 1
-ORDER BY D.documentid DESC;
+    COALESCE(L.FULL_NAME, U.LOGIN) AS FULL_NAME"""
+
+# texto longo (descrição/orientação/solução/observação): lido sob demanda, por documentid
+COLS_DETALHE = ["descSolicitante", "orientacao", "solucao", "DSL_OBS_TAR"]
+SQL_COLUNAS_TEXTO = """
+    D.[ID],
+    D.documentid,
+    D.[numSolFluig],
+    PW.NUM_PROCES,
+    D.[descSolicitante],
+    D.[orientacao],
+    D.[solucao],
+    UP.DSL_OBS_TAR"""
+
+# carga completa (histórico inteiro)
+sql_query = SQL_CHAMADOS.format(colunas=SQL_COLUNAS, cte_alterados="", filtro_docs="", filtro_proces="", filtro_where="")
+
+# carga incremental: só os documentos que mudaram desde a marca d'água
+# (ID do ML001072 é identity: cada nova versão do formulário gera linha com ID maior)
+SQL_DOCS_ALTERADOS = """DocsAlterados AS (
+    SELECT M.documentid
+    FROM [FLUIG_COMPASA].[dbo].[ML001072] M
+    WHERE M.[ID] > ?
+    UNION
+    SELECT PW.NR_DOCUMENTO_CARD
+    FROM PROCES_WORKFLOW PW
+    WHERE PW.START_DATE >= ? OR PW.END_DATE >= ?
+    UNION
+    SELECT PW.NR_DOCUMENTO_CARD
+    FROM TAR_PROCES P
+    JOIN PROCES_WORKFLOW PW
+        ON PW.NUM_PROCES = P.NUM_PROCES
+    WHERE P.ASSIGN_START_DATE >= ?
+),
 """
+sql_delta = SQL_CHAMADOS.format(
+    colunas=SQL_COLUNAS,
+    cte_alterados=SQL_DOCS_ALTERADOS,
+    filtro_docs="WHERE documentid IN (SELECT documentid FROM DocsAlterados)",
+    filtro_proces=(
+        "WHERE P.NUM_PROCES IN (SELECT PW2.NUM_PROCES FROM PROCES_WORKFLOW PW2 "
+        "WHERE PW2.NR_DOCUMENTO_CARD IN (SELECT documentid FROM DocsAlterados))"
+    ),
+    filtro_where="",
+)
+
+# marca d'água lida ANTES da query principal (relógio do próprio SQL Server)
+sql_marca_dagua = """
+SELECT
+    (SELECT MAX([ID]) FROM [FLUIG_COMPASA].[dbo].[ML001072]) AS WM_ID,
+    GETDATE() AS WM_DATA;
+"""
+
+# pushdown: com filtro ativo, busca no banco só as linhas do filtro (WHERE com parâmetros)
+# em vez de filtrar o snapshot. Mês fica no pandas (dt_emissao não é data no formulário).
+PUSHDOWN_SQL = False
+SQL_FILTRO_EXPR = {
+    "f_solicitante": "LTRIM(RTRIM(D.[nome_solicitante]))",
+    "f_num_solicitacao": "LTRIM(RTRIM(CAST(D.[numSolFluig] AS VARCHAR(50))))",
+    "f_status": (
+        "CASE WHEN PW.STATUS = 0 THEN 'ATIVO' WHEN PW.STATUS = 1 THEN 'CANCELADO' "
+        "WHEN PW.STATUS = 2 THEN 'FINALIZADO' ELSE 'N ENCONTRADO' END"
+    ),
+    "f_tecnico": (
+        "LTRIM(RTRIM(CASE WHEN D.[nm_tecAtual] IS NULL OR LTRIM(RTRIM(D.[nm_tecAtual])) = '' "
+        "THEN COALESCE(L.FULL_NAME, U.LOGIN) ELSE D.[nm_tecAtual] END))"
+    ),
+    "f_input1": "LTRIM(RTRIM(D.[input1]))",
+    "f_input2": "LTRIM(RTRIM(D.[input2]))",
+    "f_atribuicao": "LTRIM(RTRIM(D.[nm_atribuicao]))",
+}
+
+SYNC_INCREMENTAL = True          # False = volta a rodar a query completa a cada atualização
+SYNC_COMPLETO_MIN = 30           # ressincroniza tudo de tempos em tempos (pega exclusões/ajustes manuais)
+SYNC_MARGEM_MIN = 5              # folga na marca d'água p/ transações que commitaram atrasadas
 
 
 
@@ -100,22 +199,19 @@ ORDER BY D.documentid DESC;
 # =========================
 # 2) HELPERS
 # =========================
-def opts_from_series(s: pd.Series):
-    if s is None:
-        return []
-    vals = (
-        s.dropna()
-        .astype(str)
-        .replace({"": np.nan, "nan": np.nan, "None": np.nan})
-        .dropna()
-        .unique()
-        .tolist()
-    )
-    return [{"label": v, "value": v} for v in sorted(vals)]
+def contar_codigos(codigos: np.ndarray, categorias, label: str, pesos=None) -> pd.DataFrame:
+    qtd = np.bincount(codigos + 1, weights=pesos, minlength=len(categorias) + 1).astype(np.int64)
+    nomes = np.concatenate([["N/I"], categorias.astype(str)])
+    out = pd.DataFrame({label: nomes, "QTD": qtd})
+    out = out[out["QTD"] > 0].groupby(label, as_index=False, sort=False)["QTD"].sum()
+    return out.sort_values("QTD", ascending=False, kind="stable").reset_index(drop=True)
 
 def count_df(dff: pd.DataFrame, col: str, label: str):
     if col not in dff.columns:
         return pd.DataFrame({label: [], "QTD": []})
+    if isinstance(dff[col].dtype, pd.CategoricalDtype):
+        # coluna já normalizada no preparar_campos: conta direto nos códigos inteiros
+        return contar_codigos(dff[col].cat.codes.to_numpy(), dff[col].cat.categories, label)
     return (
         dff[col]
         .fillna("N/I")
@@ -156,19 +252,91 @@ def kpi_body(titulo, valor, sub="", icon="bi bi-bar-chart"):
         style={"height": "110px", "display": "flex", "alignItems": "center", "justifyContent": "center"},
     )
 
+# =========================
+# SLA EM HORAS ÚTEIS (vetorizado: calendário + minutos úteis acumulados por dia)
+# =========================
+EXPEDIENTE_INICIO = 8 * 60      # minutos desde 00:00
+EXPEDIENTE_FIM = 18 * 60
+FERIADOS_EMPRESA = []           # datas extras da Compasa, ex.: ["2025-12-24", "2025-12-31"]
+
+def _pascoa(ano: int) -> pd.Timestamp:
+    # algoritmo de Meeus/Jones/Butcher (calendário gregoriano)
+    a, b, c = ano % 19, ano // 100, ano % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return pd.Timestamp(ano, mes, dia)
+
+def feriados(ano_ini: int, ano_fim: int) -> np.ndarray:
+    datas = []
+    for ano in range(ano_ini, ano_fim + 1):
+        datas += [f"{ano}-{md}" for md in ("01-01", "04-21", "05-01", "09-07", "10-12", "11-02", "11-15", "11-20", "12-25")]
+        pascoa = _pascoa(ano)
+        # carnaval (seg/ter), sexta-feira santa, corpus christi
+        datas += [(pascoa + pd.Timedelta(days=n)).strftime("%Y-%m-%d") for n in (-48, -47, -2, 60)]
+    datas += FERIADOS_EMPRESA
+    return np.unique(np.array(datas, dtype="datetime64[D]"))
+
+@lru_cache(maxsize=8)
+def _tabela_minutos_uteis(dia_ini: int, dia_fim: int):
+    """Dias úteis e minutos úteis acumulados até o início de cada dia, de dia_ini a dia_fim."""
+    dias = np.arange(dia_ini, dia_fim + 1).astype("datetime64[D]")
+    anos = dias.astype("datetime64[Y]").astype(int) + 1970
+    util = np.is_busday(dias, holidays=feriados(int(anos.min()), int(anos.max())))
+    acum = np.concatenate([[0], np.cumsum(util * (EXPEDIENTE_FIM - EXPEDIENTE_INICIO))])
+    return util, acum
+
+def minutos_uteis_ate(ts: np.ndarray, dia_ini: int, dia_fim: int) -> np.ndarray:
+    util, acum = _tabela_minutos_uteis(dia_ini, dia_fim)
+    dia = ts.astype("datetime64[D]")
+    idx = dia.astype(np.int64) - dia_ini
+    minuto = (ts - dia) / np.timedelta64(1, "m")
+    no_dia = np.clip(minuto - EXPEDIENTE_INICIO, 0, EXPEDIENTE_FIM - EXPEDIENTE_INICIO) * util[idx]
+    return acum[idx] + no_dia
+
+def horas_uteis(inicio: pd.Series, fim: pd.Series) -> np.ndarray:
+    """Horas úteis entre inicio e fim para o frame inteiro numa passada; NaT => NaN."""
+    ini = inicio.to_numpy(dtype="datetime64[ns]")
+    fi = fim.to_numpy(dtype="datetime64[ns]")
+    ok = ~(np.isnat(ini) | np.isnat(fi))
+    out = np.full(len(ini), np.nan)
+    if not ok.any():
+        return out
+    # faixa de dias arredondada p/ anos inteiros => a tabela em cache serve para vários refreshs
+    anos = np.concatenate([ini[ok], fi[ok]]).astype("datetime64[Y]")
+    dia_ini = int(anos.min().astype("datetime64[D]").astype(np.int64))
+    dia_fim = int((anos.max() + 1).astype("datetime64[D]").astype(np.int64))
+    out[ok] = (minutos_uteis_ate(fi[ok], dia_ini, dia_fim) - minutos_uteis_ate(ini[ok], dia_ini, dia_fim)) / 60
+    return np.maximum(out, 0)
+
+COLS_CATEGORICAS = [
+    "STATUS", "MES_EMISSAO", "numSolFluig", "nm_tecAtual", "input1", "input2",
+    "nm_atribuicao", "nome_solicitante", "lb_impacto",
+]
+
+def categorizar(s: pd.Series, maiusculo=False) -> pd.Series:
+    s = s.astype("string").str.strip()
+    if maiusculo:
+        s = s.str.upper()
+    s = s.mask(s.isin(["", "NAN", "NaT", "nan", "None"]))
+    return s.astype("category")
+
 def preparar_campos(dff: pd.DataFrame) -> pd.DataFrame:
     dff["START_DATE"] = pd.to_datetime(dff.get("START_DATE"), errors="coerce")
     dff["END_DATE"] = pd.to_datetime(dff.get("END_DATE"), errors="coerce")
     dff["dt_emissao"] = pd.to_datetime(dff.get("dt_emissao"), errors="coerce", dayfirst=True)
     dff["MES_EMISSAO"] = dff["dt_emissao"].dt.to_period("M").astype(str).str.replace("-", "/")
 
-    dff["STATUS"] = (
-        dff["STATUS"]
-        .astype(str)
-        .str.strip()
-        .str.upper()
-        .replace({"NAN": np.nan})
-    )
+    # colunas de baixa cardinalidade: normaliza 1x e guarda como categoria (filtro/contagem nos códigos)
+    for col in COLS_CATEGORICAS:
+        if col in dff.columns:
+            dff[col] = categorizar(dff[col], maiusculo=(col == "STATUS"))
 
     dff["SLA_PROCESSO"] = np.where(
         dff["STATUS"] == "FINALIZADO",
@@ -180,8 +348,654 @@ def preparar_campos(dff: pd.DataFrame) -> pd.DataFrame:
     dff["SLA_CHAMADO"] = (dff["END_DATE"] - dff["START_DATE"]).dt.total_seconds() / 86400
     dff["SLA_CHAMADO"] = pd.to_numeric(dff["SLA_CHAMADO"], errors="coerce").fillna(0).astype(int)
 
+    # o que vai para a gestão: horas úteis (sem fim de semana/feriado, só expediente)
+    fim_proc = dff["END_DATE"].where(dff["STATUS"] == "FINALIZADO", pd.Timestamp.now())
+    dff["SLA_PROCESSO_HU"] = np.round(np.nan_to_num(horas_uteis(dff["START_DATE"], fim_proc)), 1)
+    dff["SLA_CHAMADO_HU"] = np.round(np.nan_to_num(horas_uteis(dff["START_DATE"], dff["END_DATE"])), 1)
+
     return dff
 
+# id do dropdown da sidebar -> coluna do DataFrame
+FILTROS_SIDEBAR = {
+    "f_solicitante": "nome_solicitante",
+    "f_mes_emissao": "MES_EMISSAO",
+    "f_num_solicitacao": "numSolFluig",
+    "f_status": "STATUS",
+    "f_tecnico": "nm_tecAtual",
+    "f_input1": "input1",
+    "f_input2": "input2",
+    "f_atribuicao": "nm_atribuicao",
+}
+
+def _normalizar_alvo(col, vals):
+    if isinstance(vals, str):
+        vals = [vals]
+    if not vals:
+        return []
+    alvo = [str(x).strip() for x in vals]
+    if col == "STATUS":
+        alvo = [x.upper() for x in alvo]
+    return alvo
+
+def aplicar_filtros(dff: pd.DataFrame, filtros: dict, indices: dict = None) -> pd.DataFrame:
+    if indices is not None:
+        ids = linhas_filtradas(indices, filtros)
+        return dff if ids is None else dff.iloc[ids]
+
+    mask = None
+    for fid, col in FILTROS_SIDEBAR.items():
+        alvo = _normalizar_alvo(col, filtros.get(fid))
+        if not alvo:
+            continue
+        cat = dff[col].cat
+        codigos = cat.categories.get_indexer(alvo)
+        m = np.isin(cat.codes.to_numpy(), codigos[codigos >= 0])
+        mask = m if mask is None else (mask & m)
+    return dff if mask is None else dff[mask]
+
+def linhas_snapshot(snap: dict, filtros: dict):
+    """Posições das linhas do snapshot nos filtros; com busca no texto, da mais relevante p/ a menos.
+
+    None = nenhum filtro ativo.
+    """
+    ids = linhas_filtradas(snap["indices"], filtros)
+    achados = buscar_texto(snap["texto"], filtros.get(FILTRO_TEXTO))
+    if achados is None:
+        return ids
+    if ids is not None:
+        achados = achados[np.isin(achados, ids, assume_unique=True)]
+    return achados
+
+def _so_achados_no_texto(snap: dict, dff: pd.DataFrame, filtros: dict) -> pd.DataFrame:
+    # pushdown: o índice de texto é do snapshot, então o cruzamento é por documentid
+    achados = buscar_texto(snap["texto"], filtros.get(FILTRO_TEXTO))
+    if achados is None:
+        return dff
+    return dff[dff["documentid"].isin(snap["df"]["documentid"].to_numpy()[achados])]
+
+def filtrar_snapshot(snap: dict, filtros: dict) -> pd.DataFrame:
+    if PUSHDOWN_SQL and any(filtros.get(fid) for fid in SQL_FILTRO_EXPR):
+        return _so_achados_no_texto(snap, aplicar_filtros(ler_filtrado(snap, filtros), filtros), filtros)
+    ids = linhas_snapshot(snap, filtros)
+    return snap["df"] if ids is None else snap["df"].iloc[ids]
+
+# =========================
+# ÍNDICE INVERTIDO DOS FILTROS (montado 1x por versão do snapshot)
+# =========================
+def construir_indices(dff: pd.DataFrame) -> dict:
+    """Para cada filtro da sidebar: valor -> ids de linha ordenados (formato CSR)."""
+    indices = {}
+    for fid, col in FILTROS_SIDEBAR.items():
+        cat = dff[col].cat
+        codigos = cat.codes.to_numpy()
+        linhas = np.argsort(codigos, kind="stable").astype(np.int32)
+        # linhas[inicio[k]:inicio[k + 1]] = linhas do código k - 1 (posição 0 = vazios)
+        inicio = np.searchsorted(codigos[linhas], np.arange(-1, len(cat.categories) + 1))
+        indices[fid] = {"categorias": cat.categories, "linhas": linhas, "inicio": inicio}
+    return indices
+
+def _linhas_do_valor(ind: dict, alvo: list) -> np.ndarray:
+    cods = np.unique(ind["categorias"].get_indexer(alvo))
+    cods = cods[cods >= 0] + 1
+    partes = [ind["linhas"][ind["inicio"][k]:ind["inicio"][k + 1]] for k in cods]
+    if not partes:
+        return np.empty(0, dtype=np.int32)
+    return partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes))
+
+def linhas_filtradas(indices: dict, filtros: dict):
+    """ids (ordenados) das linhas que passam em todos os filtros; None = nenhum filtro ativo."""
+    conjuntos = []
+    for fid, col in FILTROS_SIDEBAR.items():
+        alvo = _normalizar_alvo(col, filtros.get(fid))
+        if alvo:
+            conjuntos.append(_linhas_do_valor(indices[fid], alvo))
+    if not conjuntos:
+        return None
+
+    # OU dentro do filtro (acima), E entre filtros começando pelo menor conjunto
+    conjuntos.sort(key=len)
+    ids = conjuntos[0]
+    for outro in conjuntos[1:]:
+        if len(ids) == 0:
+            break
+        ids = np.intersect1d(ids, outro, assume_unique=True)
+    return ids
+
+def opts_from_indice(ind: dict, com_qtd=True):
+    qtd = np.diff(ind["inicio"])[1:]
+    return [
+        {"label": f"{v} ({n:,})".replace(",", ".") if com_qtd else str(v), "value": v}
+        for v, n in zip(ind["categorias"].astype(str), qtd)
+        if n > 0
+    ]
+
+# =========================
+# BUSCA POR PREFIXO DO Nº SOLICITAÇÃO (dropdown com busca no servidor)
+# =========================
+NUMSOL_MAX_OPCOES = 50   # o dropdown nunca recebe mais que isso, não importa o tamanho do histórico
+
+def construir_prefixos(ind: dict) -> dict:
+    """Nºs distintos em ordem de texto (faixa por prefixo via searchsorted) + os mais recentes."""
+    qtd = np.diff(ind["inicio"])[1:]
+    valores = np.asarray(ind["categorias"].astype(str), dtype=str)[qtd > 0]
+    numero = np.nan_to_num(pd.to_numeric(valores, errors="coerce").astype(float), nan=-1)
+    recentes = valores[np.argsort(-numero, kind="stable")]
+    return {"valores": np.sort(valores), "recentes": recentes[:NUMSOL_MAX_OPCOES]}
+
+def buscar_prefixo(pref: dict, texto: str, n: int = NUMSOL_MAX_OPCOES) -> list:
+    texto = str(texto or "").strip()
+    if not texto:
+        return pref["recentes"][:n].tolist()
+    v = pref["valores"]
+    ini = np.searchsorted(v, texto, side="left")
+    fim = np.searchsorted(v, texto + "\uffff", side="left")
+    return v[ini:min(fim, ini + n)].tolist()
+
+# =========================
+# TEXTO LONGO SOB DEMANDA (fora do snapshot: detalhe do chamado, busca e export)
+# =========================
+TEXTO_LOTE = 512           # documentids por consulta (IN com 2x isso de parâmetros, abaixo do limite de 2100)
+TEXTO_LER_TUDO = 8         # acima de N lotes compensa 1 leitura completa em vez de várias por lote
+DETALHE_CACHE_MAX = 500    # chamados abertos no painel de detalhe que ficam em memória
+
+sql_textos_todos = SQL_CHAMADOS.format(
+    colunas=SQL_COLUNAS_TEXTO, cte_alterados="", filtro_docs="", filtro_proces="", filtro_where=""
+)
+
+def _sql_textos(ids: list):
+    # mesmo filtro nos 2 CTEs: o banco só numera as versões/tarefas dos documentos pedidos
+    docs, params = where_parametrizado({"d": "documentid"}, {"d": ids})
+    proces, _ = where_parametrizado({"d": "PW2.NR_DOCUMENTO_CARD"}, {"d": ids})
+    sql = SQL_CHAMADOS.format(
+        colunas=SQL_COLUNAS_TEXTO,
+        cte_alterados="",
+        filtro_docs=f"WHERE 1 = 1{docs}",
+        filtro_proces=(
+            "WHERE P.NUM_PROCES IN (SELECT PW2.NUM_PROCES FROM PROCES_WORKFLOW PW2 "
+            f"WHERE 1 = 1{proces})"
+        ),
+        filtro_where="",
+    )
+    return sql, params + params
+
+def ler_textos(documentids, ler_tudo=True) -> pd.DataFrame:
+    """Colunas de texto longo dos documentos pedidos (1 linha por documentid).
+
+    `ler_tudo=False`: sempre em lotes de IN, mesmo com muitos ids (quem lê em blocos, como o export,
+    não pode cair na leitura da tabela inteira a cada bloco).
+    """
+    ids = sorted({str(d) for d in documentids if pd.notna(d)})
+    if ler_tudo and len(ids) > TEXTO_LOTE * TEXTO_LER_TUDO:
+        textos = db.ler_sql(sql_textos_todos)
+        textos = textos[textos["documentid"].astype(str).isin(ids)]
+    else:
+        partes = []
+        for i in range(0, len(ids), TEXTO_LOTE):
+            sql, params = _sql_textos(ids[i:i + TEXTO_LOTE])
+            partes.append(db.ler_sql(sql, params=params, preparar=True))
+        if not partes:
+            return pd.DataFrame(columns=["ID", "documentid", "numSolFluig", "NUM_PROCES", *COLS_DETALHE])
+        textos = pd.concat(partes, ignore_index=True)
+    return textos.drop_duplicates("documentid").reset_index(drop=True)
+
+_detalhes_lock = threading.Lock()
+_detalhes = OrderedDict()   # str(documentid) -> textos do chamado
+
+def detalhes_chamados(documentids) -> dict:
+    """str(documentid) -> textos (LRU); os que faltam no cache vêm numa leitura só."""
+    chaves = list(dict.fromkeys(str(d) for d in documentids))
+    out = {}
+    with _detalhes_lock:
+        for chave in chaves:
+            if chave in _detalhes:
+                _detalhes.move_to_end(chave)
+                out[chave] = _detalhes[chave]
+    faltam = [c for c in chaves if c not in out]
+    if faltam:
+        textos = ler_textos(faltam)
+        lidos = {str(r["documentid"]): r for r in textos.to_dict("records")}
+        with _detalhes_lock:
+            for chave in faltam:
+                out[chave] = _detalhes[chave] = lidos.get(chave, {})
+            while len(_detalhes) > DETALHE_CACHE_MAX:
+                _detalhes.popitem(last=False)
+    return out
+
+def detalhe_chamado(documentid) -> dict:
+    """Textos de 1 chamado (LRU): abrir de novo o mesmo chamado não volta ao banco."""
+    return detalhes_chamados([documentid])[str(documentid)]
+
+def invalidar_detalhes(alterados=None):
+    # carga completa (alterados=None) pode ter mudado qualquer chamado: limpa tudo
+    with _detalhes_lock:
+        if alterados is None:
+            _detalhes.clear()
+        for d in alterados or []:
+            _detalhes.pop(str(d), None)
+
+# =========================
+# BUSCA NO TEXTO (índice invertido de descSolicitante / orientacao / solucao)
+# =========================
+COLS_TEXTO = ["descSolicitante", "orientacao", "solucao"]
+FILTRO_TEXTO = "f_busca"
+BM25_K1, BM25_B = 1.2, 0.75
+
+_STOPWORDS = set("""
+a ao aos as ate com como da das de dela dele deles do dos e ela elas ele eles em entre era essa esse
+esta este eu foi for ha isso ja lhe mais mas me mesmo meu minha muito na nao nas nem no nos num numa
+o os ou para pela pelas pelo pelos por qual quando que se sem ser seu seus so sua suas tambem te tem
+um uma voce voces favor bom boa dia tarde noite obrigado obrigada att
+""".split())
+
+# sufixos (já sem acento) testados do mais longo p/ o mais curto; radical fica com >= 3 letras
+_SUF_PLURAL = [("oes", "ao"), ("aes", "ao"), ("res", "r"), ("ns", "m"), ("s", "")]
+_SUF_RADICAL = [
+    "amento", "imento", "mente", "acao", "icao", "ador", "agem", "ando", "endo", "indo",
+    "ado", "ido", "ao", "ar", "er", "ir", "a", "o", "e",
+]
+
+@lru_cache(maxsize=200_000)
+def radical(palavra: str) -> str:
+    """Stemming leve em português: tira plural e as terminações mais comuns (pt-BR sem acento)."""
+    if len(palavra) <= 3 or any(ch.isdigit() for ch in palavra):
+        return palavra   # siglas e códigos de erro ficam como estão
+    for suf, troca in _SUF_PLURAL:
+        if palavra.endswith(suf) and not palavra.endswith("ss") and len(palavra) - len(suf) >= 3:
+            palavra = palavra[:len(palavra) - len(suf)] + troca
+            break
+    for suf in _SUF_RADICAL:
+        if palavra.endswith(suf) and len(palavra) - len(suf) >= 3:
+            return palavra[:-len(suf)]
+    return palavra
+
+def tokens_texto(s: pd.Series) -> pd.Series:
+    # minúsculas + sem acento (NFKD tira o diacrítico) + só letras/números
+    s = s.fillna("").astype(str).str.lower().str.normalize("NFKD").str.replace(r"[\u0300-\u036f]", "", regex=True)
+    return s.str.findall(r"[a-z0-9]+")
+
+def termos_da_consulta(consulta: str) -> list:
+    palavras = tokens_texto(pd.Series([consulta])).iat[0]
+    return list(dict.fromkeys(radical(p) for p in palavras if p not in _STOPWORDS))
+
+# termos de cada documento ficam em cache por documentid + ID da versão do formulário:
+# refresh só busca no banco e re-tokeniza o texto dos documentos que ganharam versão nova
+_texto_cache = {"vocab": {}, "id": {}, "termos": {}, "assinatura": {}, "desc": {}}
+
+def _termos_documentos(palavras: pd.Series, vocab: dict) -> list:
+    """Para cada documento do lote: (ids dos termos, frequência de cada um), tudo num passo só."""
+    ex = palavras.reset_index(drop=True).explode().dropna()
+    ex = ex[~ex.isin(_STOPWORDS)]
+    codigos, distintas = pd.factorize(ex)
+    ids = np.array([vocab.setdefault(radical(p), len(vocab)) for p in distintas], dtype=np.int64)
+    # chave doc|termo -> unique conta a frequência e já sai ordenado por documento
+    chave, freq = np.unique((ex.index.to_numpy(np.int64) << 32) | ids[codigos], return_counts=True)
+    doc, termo = chave >> 32, (chave & 0xFFFFFFFF).astype(np.int32)
+    lim = np.searchsorted(doc, np.arange(len(palavras) + 1))
+    return [(termo[a:b], freq[a:b]) for a, b in zip(lim[:-1], lim[1:])]
+
+def construir_indice_texto(dff: pd.DataFrame) -> dict:
+    """Termo -> linhas do snapshot (CSR) + frequências, p/ ranking BM25. Chamado 1x por versão."""
+    cache = _texto_cache
+    vocab = cache["vocab"]
+    docs = dff["documentid"].to_numpy()
+    versoes = dff["ID"].to_numpy()
+
+    mudou = np.array([cache["id"].get(d) != v for d, v in zip(docs, versoes)], dtype=bool)
+    if mudou.any():
+        # o texto não fica no snapshot: vem do banco só p/ os documentos novos/alterados
+        textos = ler_textos(docs[mudou]).astype({"documentid": str}).set_index("documentid")
+        textos = textos.reindex(docs[mudou].astype(str))
+        texto = textos[COLS_TEXTO[0]].fillna("").astype(str)
+        for col in COLS_TEXTO[1:]:
+            texto = texto + " " + textos[col].fillna("").astype(str)
+        lote = _termos_documentos(tokens_texto(texto), vocab)
+        # só a descrição (o que o solicitante escreveu): duplicados e sugestão de grupo
+        palavras_desc = tokens_texto(textos["descSolicitante"])
+        assinaturas = assinaturas_minhash(palavras_desc)
+        lote_desc = _termos_documentos(palavras_desc, vocab)
+        for d, v, termos_doc, assin, desc in zip(docs[mudou], versoes[mudou], lote, assinaturas, lote_desc):
+            cache["termos"][d] = termos_doc
+            cache["assinatura"][d] = assin
+            cache["desc"][d] = desc
+            cache["id"][d] = v
+    if len(cache["termos"]) > len(docs):
+        # documento que saiu do snapshot (ex.: excluído) sai do cache também
+        vivos = set(docs.tolist())
+        for d in [d for d in cache["termos"] if d not in vivos]:
+            del cache["termos"][d], cache["id"][d], cache["assinatura"][d], cache["desc"][d]
+
+    por_linha = [cache["termos"][d] for d in docs]
+    qtd_termos = np.fromiter((len(t) for t, _ in por_linha), dtype=np.int64, count=len(docs))
+    termos = np.concatenate([t for t, _ in por_linha]) if len(docs) else np.empty(0, np.int32)
+    freq = np.concatenate([f for _, f in por_linha]) if len(docs) else np.empty(0, np.int64)
+    linhas = np.repeat(np.arange(len(docs), dtype=np.int32), qtd_termos)
+
+    ordem = np.argsort(termos, kind="stable")     # estável: linhas continuam crescentes dentro do termo
+    tam_doc = np.bincount(linhas, weights=freq, minlength=len(docs))
+    palavras_vocab = np.array(list(vocab), dtype=str)
+    ordem_vocab = np.argsort(palavras_vocab)
+    return {
+        "linhas": linhas[ordem],
+        "freq": freq[ordem].astype(np.float32),
+        "inicio": np.searchsorted(termos[ordem], np.arange(len(vocab) + 1)),
+        "tam_doc": tam_doc,
+        "tam_medio": max(float(tam_doc.mean()) if len(docs) else 0.0, 1.0),
+        "vocab": palavras_vocab[ordem_vocab],      # ordenado: termo digitado vale como prefixo
+        "vocab_ids": ordem_vocab,
+    }
+
+def indice_texto_vazio(n: int) -> dict:
+    """Índice sem termos p/ n linhas: a busca não acha nada até uma carga remontar o índice."""
+    return {
+        "linhas": np.empty(0, np.int32),
+        "freq": np.empty(0, np.float32),
+        "inicio": np.zeros(1, np.int64),
+        "tam_doc": np.zeros(n),
+        "tam_medio": 1.0,
+        "vocab": np.empty(0, dtype=str),
+        "vocab_ids": np.empty(0, np.int64),
+    }
+
+def buscar_texto(ind: dict, consulta: str):
+    """Posições das linhas com todos os termos (prefixo do radical), da mais relevante p/ a menos.
+
+    None = consulta vazia (sem filtro de texto).
+    """
+    termos = termos_da_consulta(consulta)
+    if not termos:
+        return None
+    n = len(ind["tam_doc"])
+    norma = BM25_K1 * (1 - BM25_B + BM25_B * ind["tam_doc"] / ind["tam_medio"])
+    total = np.zeros(n)
+    presente = np.ones(n, dtype=bool)
+    for termo in termos:
+        ini = np.searchsorted(ind["vocab"], termo, side="left")
+        fim = np.searchsorted(ind["vocab"], termo + "\uffff", side="left")
+        partes = [slice(ind["inicio"][t], ind["inicio"][t + 1]) for t in ind["vocab_ids"][ini:fim]]
+        if not partes:
+            return np.empty(0, dtype=np.int32)
+        linhas = np.concatenate([ind["linhas"][p] for p in partes])
+        freq = np.concatenate([ind["freq"][p] for p in partes])
+        tf = np.bincount(linhas, weights=freq, minlength=n)
+        qtd_docs = np.count_nonzero(tf)
+        idf = np.log(1 + (n - qtd_docs + 0.5) / (qtd_docs + 0.5))
+        total += idf * tf * (BM25_K1 + 1) / (tf + norma)
+        presente &= tf > 0
+    achados = np.flatnonzero(presente)
+    return achados[np.argsort(-total[achados], kind="stable")].astype(np.int32)
+
+# =========================
+# CHAMADOS DUPLICADOS (MinHash + LSH sobre descSolicitante; sem comparar todos os pares)
+# =========================
+# - texto -> pares de palavras seguidas (shingles) -> assinatura MinHash (1x por versão do formulário,
+#   junto com o índice de texto: só documento novo/alterado é recalculado)
+# - LSH: assinatura cortada em bandas; só quem cai na mesma faixa de alguma banda é comparado,
+#   e só com o vizinho mais próximo no tempo (linear, não quadrático)
+# - pares com similaridade estimada >= DUP_LIMIAR viram arestas; componente conexo = incidente
+DUP_PERMUTACOES = 64
+DUP_BANDAS = 16            # 16 bandas x 4 valores: par com Jaccard a partir de ~0,5 vira candidato
+DUP_LIMIAR = 0.7           # similaridade estimada mínima p/ juntar 2 chamados
+DUP_JANELA_DIAS = 7        # só junta chamados abertos com até N dias de diferença
+DUP_MIN_PALAVRAS = 4       # descrição mais curta que isso não entra (pouco conteúdo p/ comparar)
+DUP_LOTE = 20_000          # shingles por passo do MinHash (limita a matriz temporária)
+
+_dup_rng = np.random.default_rng(1072)
+_DUP_A = _dup_rng.integers(1, 2**63, DUP_PERMUTACOES, dtype=np.uint64) | np.uint64(1)
+_DUP_B = _dup_rng.integers(0, 2**63, DUP_PERMUTACOES, dtype=np.uint64)
+
+def assinaturas_minhash(palavras: pd.Series) -> list:
+    """Assinatura MinHash (uint32 x DUP_PERMUTACOES) de cada texto tokenizado; None = texto curto."""
+    palavras = palavras.reset_index(drop=True)
+    out = [None] * len(palavras)
+    ex = palavras[palavras.str.len() >= DUP_MIN_PALAVRAS].explode()
+    if ex.empty:
+        return out
+    doc = ex.index.to_numpy(np.int64)
+    tok = ex.to_numpy(dtype=object)
+    seguida = doc[1:] == doc[:-1]
+    pares = tok[:-1][seguida] + " " + tok[1:][seguida]
+    doc = doc[:-1][seguida]
+    x = pd.util.hash_array(pares.astype(object)) >> np.uint64(32)   # shingle -> 32 bits
+
+    # min por documento de h_i(x) = (a_i * x + b_i) >> 32 (multiply-shift, estoura em 64 bits de propósito)
+    docs, inicio = np.unique(doc, return_index=True)
+    lim = np.append(inicio, len(doc))
+    minimos = np.empty((len(docs), DUP_PERMUTACOES), dtype=np.uint32)
+    passo = max(1, DUP_LOTE * len(docs) // len(doc))   # documentos por passo (~DUP_LOTE shingles)
+    for k in range(0, len(docs), passo):
+        a, b = lim[k], lim[min(k + passo, len(docs))]
+        with np.errstate(over="ignore"):
+            h = ((x[a:b, None] * _DUP_A + _DUP_B) >> np.uint64(32)).astype(np.uint32)
+        minimos[k:k + passo] = np.minimum.reduceat(h, inicio[k:k + passo] - a, axis=0)
+    for d, m in zip(docs, minimos):
+        out[d] = m
+    return out
+
+def agrupar_duplicados(dff: pd.DataFrame) -> np.ndarray:
+    """Incidente de cada linha = menor documentid do grupo de quase duplicados; NaN = sem grupo."""
+    out = np.full(len(dff), np.nan)
+    cache = _texto_cache["assinatura"]
+    assin = [cache.get(d) for d in dff["documentid"].to_numpy()]
+    dias = dff["START_DATE"].to_numpy().astype("datetime64[D]")
+    tem = np.fromiter((a is not None for a in assin), dtype=bool, count=len(assin))
+    linhas = np.flatnonzero(tem & ~np.isnat(dias))
+    if len(linhas) < 2:
+        return out
+    sig = np.stack([assin[i] for i in linhas])
+    dia = dias[linhas].astype(np.int64)
+
+    por_banda = DUP_PERMUTACOES // DUP_BANDAS
+    origem, destino = [], []
+    for banda in range(DUP_BANDAS):
+        faixa = sig[:, banda * por_banda:(banda + 1) * por_banda].astype(np.uint64)
+        chave = faixa[:, 0]
+        with np.errstate(over="ignore"):
+            for c in range(1, por_banda):
+                chave = chave * np.uint64(1_000_003) ^ faixa[:, c]
+        # mesma faixa + vizinho no tempo (ordenado por chave, depois dia)
+        ordem = np.lexsort((dia, chave))
+        a, b = ordem[:-1], ordem[1:]
+        ok = (chave[a] == chave[b]) & (dia[b] - dia[a] <= DUP_JANELA_DIAS)
+        origem.append(a[ok])
+        destino.append(b[ok])
+    origem, destino = np.concatenate(origem), np.concatenate(destino)
+    if len(origem) == 0:
+        return out
+    par = np.unique(np.minimum(origem, destino) * len(linhas) + np.maximum(origem, destino))
+    origem, destino = par // len(linhas), par % len(linhas)
+    similar = (sig[origem] == sig[destino]).mean(axis=1) >= DUP_LIMIAR
+    origem, destino = origem[similar], destino[similar]
+
+    grafo = sp.coo_matrix((np.ones(len(origem)), (origem, destino)), shape=(len(linhas), len(linhas)))
+    _, componente = connected_components(grafo, directed=False)
+    em_grupo = np.bincount(componente)[componente] > 1
+    ids = dff["documentid"].to_numpy()[linhas]
+    menor = pd.Series(ids).groupby(componente).transform("min").to_numpy()
+    out[linhas[em_grupo]] = menor[em_grupo]
+    return out
+
+DUP_TOP = 15   # incidentes listados no painel (os mais recentes)
+
+def incidentes(dff: pd.DataFrame) -> pd.DataFrame:
+    """Grupos de prováveis duplicados dentro das linhas filtradas, do mais recente p/ o mais antigo."""
+    base = dff[dff["INCIDENTE"].notna()]
+    if base.empty:
+        return pd.DataFrame(columns=["INCIDENTE", "CHAMADOS", "ABERTOS", "PRIMEIRO", "ULTIMO", "GRUPO"])
+    base = base.assign(ABERTO=base["END_DATE"].isna().astype(int))
+    out = base.groupby("INCIDENTE").agg(
+        CHAMADOS=("documentid", "size"),
+        ABERTOS=("ABERTO", "sum"),
+        PRIMEIRO=("START_DATE", "min"),
+        ULTIMO=("START_DATE", "max"),
+        GRUPO=("input1", "first"),
+    ).reset_index()
+    out = out[out["CHAMADOS"] > 1]
+    return out.sort_values(["ULTIMO", "CHAMADOS"], ascending=False, kind="stable").reset_index(drop=True)
+
+# =========================
+# CUBO DE CONTAGENS (montado 1x por versão; gráficos e KPIs saem dele)
+# =========================
+CUBO_DIMS = ["STATUS", "lb_impacto", "nm_tecAtual", "input1", "input2", "nm_atribuicao", "MES_EMISSAO"]
+CUBO_FILTROS = {fid: col for fid, col in FILTROS_SIDEBAR.items() if col in CUBO_DIMS}
+
+def construir_cubo(dff: pd.DataFrame) -> dict:
+    base = pd.DataFrame({c: dff[c].cat.codes.to_numpy() for c in CUBO_DIMS})
+    base["QTD"] = 1
+    base["SLA_SOMA"] = dff["SLA_PROCESSO"].to_numpy()
+    base["SLA_HU_SOMA"] = dff["SLA_PROCESSO_HU"].to_numpy()
+    base["ABERTOS"] = dff["END_DATE"].isna().to_numpy().astype(np.int64)
+    grupos = base.groupby(CUBO_DIMS, sort=False)
+    celulas = grupos.sum().reset_index()
+
+    # sketch de quantis do SLA (horas úteis) dos finalizados, 1 por célula: percentil de qualquer
+    # filtro do cubo = soma dos sketches das células (linha i da matriz = celulas.iloc[i]).
+    # mesma regra da coluna SLA: cancelado tem END_DATE, mas o SLA dele conta até agora
+    fechado = (dff["STATUS"] == "FINALIZADO").to_numpy()
+    sketch = matriz_sketches(grupos.ngroup().to_numpy()[fechado], dff["SLA_PROCESSO_HU"].to_numpy()[fechado], len(celulas))
+    return {"celulas": celulas, "categorias": {c: dff[c].cat.categories for c in CUBO_DIMS}, "sla_sketch": sketch}
+
+def fatiar_cubo(cubo: dict, filtros: dict):
+    """Células do cubo que atendem aos filtros; None se algum filtro ativo não é dimensão do cubo."""
+    if any(_normalizar_alvo(col, filtros.get(fid)) for fid, col in FILTROS_SIDEBAR.items() if fid not in CUBO_FILTROS):
+        return None
+    if str(filtros.get(FILTRO_TEXTO) or "").strip():
+        return None
+    celulas = cubo["celulas"]
+    mask = np.ones(len(celulas), dtype=bool)
+    for fid, col in CUBO_FILTROS.items():
+        alvo = _normalizar_alvo(col, filtros.get(fid))
+        if alvo:
+            cods = cubo["categorias"][col].get_indexer(alvo)
+            mask &= np.isin(celulas[col].to_numpy(), cods[cods >= 0])
+    return celulas[mask]
+
+# =========================
+# PERCENTIS DO SLA (p50/p90/p95 em horas úteis, chamados finalizados)
+# =========================
+SLA_PERCENTIS = (0.5, 0.9, 0.95)
+SLA_PCT_DIMS = {"nm_tecAtual": "Técnico", "input1": "Grupo", "MES_EMISSAO": "Mês"}
+
+def percentis_sla(snap: dict, celulas, dff: pd.DataFrame, dim: str = None) -> pd.DataFrame:
+    """[rótulo, QTD, P50, P90, P95] por valor de `dim` (ou 1 linha TOTAL), juntando sketches.
+
+    Com as células do cubo, soma os sketches guardados; sem cubo (busca/filtro fora do cubo),
+    monta os sketches das linhas filtradas na hora (mesma aproximação, sem ordenar nada).
+    """
+    if celulas is not None:
+        sketches = snap["cubo"]["sla_sketch"][celulas.index.to_numpy()]
+        codigos = celulas[dim].to_numpy() if dim else np.zeros(len(celulas), dtype=np.int64)
+        categorias = snap["cubo"]["categorias"][dim] if dim else []
+    else:
+        fechado = (dff["STATUS"] == "FINALIZADO").to_numpy()
+        n = int(fechado.sum())
+        sketches = matriz_sketches(np.arange(n), dff["SLA_PROCESSO_HU"].to_numpy()[fechado], n)
+        codigos = dff[dim].cat.codes.to_numpy()[fechado] if dim else np.zeros(n, dtype=np.int64)
+        categorias = dff[dim].cat.categories if dim else []
+
+    contagens = mesclar_por(sketches, codigos.astype(np.int64) + (1 if dim else 0), len(categorias) + 1)
+    rotulos = np.concatenate([["N/I"], np.asarray(categorias).astype(str)]) if dim else np.array(["TOTAL"])
+    pct = quantis(contagens[:len(rotulos)], SLA_PERCENTIS)
+    out = pd.DataFrame({SLA_PCT_DIMS.get(dim, "Total"): rotulos, "QTD": contagens[:len(rotulos)].sum(axis=1)})
+    for j, q in enumerate(SLA_PERCENTIS):
+        out[f"P{int(q * 100)}"] = np.round(pct[:, j], 1)
+    return out[out["QTD"] > 0].reset_index(drop=True)
+
+def resumo_filtrado(snap: dict, filtros: dict, dff: pd.DataFrame) -> dict:
+    """KPIs + contagens por dimensão; pelo cubo quando dá, senão pelas linhas já filtradas."""
+    celulas = fatiar_cubo(snap["cubo"], filtros)
+    if celulas is not None:
+        cats = snap["cubo"]["categorias"]
+        pesos = celulas["QTD"].to_numpy()
+
+        def contar(col, label):
+            return contar_codigos(celulas[col].to_numpy(), cats[col], label, pesos)
+
+        total = int(pesos.sum())
+        sla_soma = float(celulas["SLA_SOMA"].sum())
+        sla_hu_soma = float(celulas["SLA_HU_SOMA"].sum())
+        abertos = int(celulas["ABERTOS"].sum())
+    else:
+        def contar(col, label):
+            return count_df(dff, col, label)
+
+        total = len(dff)
+        sla_soma = float(dff["SLA_PROCESSO"].sum())
+        sla_hu_soma = float(dff["SLA_PROCESSO_HU"].sum())
+        abertos = int(dff["END_DATE"].isna().sum())
+
+    pct = percentis_sla(snap, celulas, dff)
+
+    periodo = contar("MES_EMISSAO", "MES")
+    periodo = periodo[periodo["MES"] != "N/I"]
+    periodo = pd.DataFrame({
+        "PERIODO": pd.to_datetime(periodo["MES"], format="%Y/%m"),
+        "QTD": periodo["QTD"].to_numpy(),
+    }).sort_values("PERIODO")
+
+    return {
+        "total": total,
+        "sla_media": (sla_soma / total) if total else 0.0,
+        "sla_hu_media": (sla_hu_soma / total) if total else 0.0,
+        "abertos": abertos,
+        "sla_p50": float(pct["P50"].iat[0]) if len(pct) else 0.0,
+        "sla_p90": float(pct["P90"].iat[0]) if len(pct) else 0.0,
+        "meses": len(periodo),
+        "status": contar("STATUS", "STATUS"),
+        "impacto": contar("lb_impacto", "Impacto"),
+        "tecnico": contar("nm_tecAtual", "Técnico"),
+        "input1": contar("input1", "Grupo"),
+        "input2": contar("input2", "Subgrupo"),
+        "periodo": periodo,
+    }
+
+# =========================
+# BACKLOG: CHAMADOS EM ABERTO POR DIA (varredura de eventos +1 abertura / -1 fechamento)
+# =========================
+# aberto ao fim do dia d  <=>  START_DATE <= d  e  (sem END_DATE  ou  END_DATE > d)
+BACKLOG_DIMS = {"nm_tecAtual": "Técnico", "input1": "Grupo"}
+BACKLOG_TOP = 8   # linhas no gráfico (maiores backlogs de hoje) + total
+
+def _dias_e_codigos(dff: pd.DataFrame, col: str):
+    ini = dff["START_DATE"].to_numpy().astype("datetime64[D]")
+    fim = dff["END_DATE"].to_numpy().astype("datetime64[D]")
+    ok = ~np.isnat(ini)
+    ini, fim = ini[ok], fim[ok]
+    fim = np.where(fim < ini, ini, fim)   # fechamento antes da abertura (dado ruim) = nunca ficou aberto
+    cod = dff[col].cat.codes.to_numpy()[ok].astype(np.int64) + 1   # 0 = sem valor
+    return ini, fim, cod, ["N/I", *dff[col].cat.categories.astype(str)]
+
+def curvas_backlog(dff: pd.DataFrame, col: str):
+    """(dias, rótulos, matriz[rótulo, dia]) com os abertos ao fim de cada dia, num passo só.
+
+    Cada chamado vira +1 no dia da abertura e -1 no dia do fechamento (por grupo);
+    bincount junta os eventos e o cumsum ao longo dos dias dá a curva.
+    """
+    ini, fim, cod, rotulos = _dias_e_codigos(dff, col)
+    if len(ini) == 0:
+        return np.array([], dtype="datetime64[D]"), rotulos, np.zeros((len(rotulos), 0), dtype=np.int64)
+    d0 = ini.min()
+    hoje = np.datetime64(pd.Timestamp.now().normalize().date(), "D")
+    n_dias = int((max(hoje, ini.max()) - d0).astype(np.int64)) + 1
+    largura = n_dias + 1   # +1: fechamento depois do último dia cai numa coluna descartada
+
+    fechado = ~np.isnat(fim)
+    pos_ini = cod * largura + (ini - d0).astype(np.int64)
+    pos_fim = cod[fechado] * largura + np.minimum((fim[fechado] - d0).astype(np.int64), n_dias)
+    tam = len(rotulos) * largura
+    eventos = np.bincount(pos_ini, minlength=tam) - np.bincount(pos_fim, minlength=tam)
+    matriz = np.cumsum(eventos.reshape(len(rotulos), largura), axis=1)[:, :n_dias]
+    return d0 + np.arange(n_dias), rotulos, matriz
+
+def backlog_em(dff: pd.DataFrame, col: str, data) -> pd.DataFrame:
+    """Situação em `data`: abertos ao fim do dia por valor de `col` (maior primeiro)."""
+    ini, fim, cod, rotulos = _dias_e_codigos(dff, col)
+    d = np.datetime64(pd.Timestamp(data).date(), "D")
+    abriu = ini <= d
+    ainda_aberto = abriu & ~(fim <= d)   # NaT <= d é False: sem fechamento continua aberto
+    qtd = np.bincount(cod[ainda_aberto], minlength=len(rotulos))
+    out = pd.DataFrame({BACKLOG_DIMS.get(col, col): rotulos, "ABERTOS": qtd})
+    return out[out["ABERTOS"] > 0].sort_values("ABERTOS", ascending=False, kind="stable").reset_index(drop=True)
+
 # =========================
 # COMPONENTES DE LAYOUT
 # =========================
@@ -198,36 +1012,846 @@ def card_com_header(titulo, graph_id):
         className="shadow-sm w-100 h-100",
     )
 
+# ordem dos gráficos em store_figuras
+GRAFICOS = ["g_status", "g_impacto", "g_tecnico", "g_input1", "g_input2", "g_periodo", "g_solicitante", "g_backlog"]
+
+# templates plotly vão 1x no layout; o callback clientside escolhe claro/escuro
+TEMAS_GRAFICOS = {
+    "claro": pio.templates["plotly"].to_plotly_json(),
+    "escuro": pio.templates["plotly_dark"].to_plotly_json(),
+}
+
+MARGEM = {"l": 10, "r": 10, "t": 30, "b": 10}
+
+def montar_figuras(resumo: dict, dff: pd.DataFrame, template: str, dim_backlog: str = "nm_tecAtual",
+                   faixa: dict = None) -> list:
+    """As figuras do painel (na ordem de GRAFICOS), já sem template.
+
+    Dicts montados direto dos agregados (figuras.py), sem plotly.express; `template` só entra na chave do cache.
+    """
+    st = resumo["status"].sort_values("QTD", ascending=False)
+    fig_status = fig_barras(
+        st["STATUS"], st["QTD"], "STATUS", "QTD", texto=True,
+        # texto em cima das barras, com folga no eixo Y para não cortar
+        trace={"texttemplate": "%{text}", "textposition": "outside", "cliponaxis": False},
+        layout={"uniformtext": {"minsize": 10, "mode": "hide"}, "yaxis": {"rangemode": "tozero"}, "margin": MARGEM},
+    )
+
+    imp = resumo["impacto"]
+    fig_impacto = fig_pizza(imp["Impacto"], imp["QTD"], "Impacto", "QTD", hole=0.6, layout={"margin": MARGEM})
+
+    tec_all = resumo["tecnico"].sort_values("QTD", ascending=False)
+    top15 = tec_all.head(15)
+    outros_qtd = tec_all["QTD"].iloc[15:].sum()
+    if outros_qtd > 0:
+        top15 = pd.concat([top15, pd.DataFrame([{"Técnico": "OUTROS", "QTD": outros_qtd}])], ignore_index=True)
+    fig_tecnico = fig_barras(
+        top15["Técnico"], top15["QTD"], "Técnico", "QTD", horizontal=True, texto=True,
+        layout={"yaxis": {"categoryorder": "total ascending"}, "margin": MARGEM},
+    )
+
+    in1 = resumo["input1"].sort_values("QTD", ascending=False).head(15)
+    fig_in1 = fig_bolhas(in1["Grupo"], in1["QTD"], "Grupo", "QTD", size_max=30, layout={"margin": MARGEM})
+
+    in2 = resumo["input2"].sort_values("QTD", ascending=False).head(20)
+    fig_in2 = fig_bolhas(in2["Subgrupo"], in2["QTD"], "Subgrupo", "QTD", size_max=30, layout={"margin": MARGEM})
+
+    top15_sol = count_df(dff, "nome_solicitante", "Solicitante").sort_values("QTD", ascending=False).head(15)
+    fig_solicitante = fig_barras(
+        top15_sol["Solicitante"], top15_sol["QTD"], "Solicitante", "QTD", texto=True,
+        layout={"xaxis": {"tickangle": -45}, "margin": MARGEM},
+    )
+
+    df_periodo = resumo["periodo"]
+    fig_periodo = fig_area(
+        df_periodo["PERIODO"], df_periodo["QTD"], "PERIODO", "QTD",
+        trace={"mode": "lines+markers", "line": {"shape": "spline", "width": 2}, "marker": {"size": 8}},
+        layout={
+            "xaxis": {"title": {"text": "Período"}}, "yaxis": {"title": {"text": "Quantidade"}},
+            "hovermode": "x unified", "margin": MARGEM,
+        },
+    )
+    if faixa is not None:
+        sem_faixa = np.isnan(faixa["inf"]).any()
+        fig_periodo = com_faixa(
+            fig_periodo, faixa["PERIODO"], faixa["media"],
+            None if sem_faixa else faixa["inf"], None if sem_faixa else faixa["sup"], "Previsão",
+        )
+
+    dias, rotulos, matriz = curvas_backlog(dff, dim_backlog)
+    if matriz.shape[1]:
+        # linhas: maiores backlogs de hoje (empate: maior pico no histórico)
+        ordem = np.lexsort((-matriz.max(axis=1), -matriz[:, -1]))
+        series = {"TOTAL": matriz.sum(axis=0), **{rotulos[i]: matriz[i] for i in ordem[:BACKLOG_TOP] if matriz[i].any()}}
+    else:
+        series = {"TOTAL": []}
+    fig_backlog = fig_linhas(
+        dias, series, "Dia", "Abertos", BACKLOG_DIMS[dim_backlog],
+        layout={"hovermode": "x unified", "margin": MARGEM},
+    )
+
+    return [fig_status, fig_impacto, fig_tecnico, fig_in1, fig_in2, fig_periodo, fig_solicitante, fig_backlog]
+
+# =========================
+# CACHE DE FIGURAS (LRU por versão + filtros + tema; guarda o JSON pronto)
+# =========================
+FIG_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_figuras_lock = threading.Lock()
+_figuras = OrderedDict()   # chave -> JSON das 7 figuras
+_figuras_stats = {"hits": 0, "misses": 0, "descartes": 0, "bytes": 0}
+
+def chave_figuras(versao: int, filtros: dict, tema: str, *opcoes) -> tuple:
+    # ordem/espaços/maiúsculas da seleção não importam; busca vale pelos radicais
+    sel = tuple(tuple(sorted(set(_normalizar_alvo(col, filtros.get(fid))))) for fid, col in FILTROS_SIDEBAR.items())
+    return versao, sel, tuple(termos_da_consulta(filtros.get(FILTRO_TEXTO))), tema, opcoes
+
+def figuras_em_cache(chave: tuple):
+    with _figuras_lock:
+        js = _figuras.get(chave)
+        if js is None:
+            _figuras_stats["misses"] += 1
+            return None
+        _figuras.move_to_end(chave)
+        _figuras_stats["hits"] += 1
+    return json.loads(js)
+
+def guardar_figuras(chave: tuple, figuras: list):
+    js = pio.json.to_json_plotly(figuras)
+    with _figuras_lock:
+        if chave in _figuras:
+            _figuras_stats["bytes"] -= len(_figuras.pop(chave))
+        _figuras[chave] = js
+        _figuras_stats["bytes"] += len(js)
+        # limite pelo tamanho do JSON (não pela quantidade): figura de filtro amplo pesa bem mais
+        while _figuras_stats["bytes"] > FIG_CACHE_MAX_BYTES and len(_figuras) > 1:
+            _figuras_stats["bytes"] -= len(_figuras.popitem(last=False)[1])
+            _figuras_stats["descartes"] += 1
+
+# =========================
+# IMPRESSÃO DO PAINEL (o que o navegador já tem x o que seria mandado agora)
+# =========================
+# dependem do relógio (abertos contam até "agora"): ficam fora do hash das linhas;
+# a data do dia entra na impressão, então o SLA dos abertos é redesenhado 1x por dia
+COLS_DO_RELOGIO = ["SLA_PROCESSO", "SLA_PROCESSO_HU"]
+
+def hash_linhas(df: pd.DataFrame) -> np.ndarray:
+    """Hash de cada linha do snapshot (1x por versão); a impressão de um filtro é a soma das suas."""
+    return pd.util.hash_pandas_object(df.drop(columns=COLS_DO_RELOGIO, errors="ignore"), index=False).to_numpy()
+
+def impressao_painel(snap: dict, filtros: dict, *opcoes) -> str:
+    pos = linhas_snapshot(snap, filtros)
+    h = snap["linhas_hash"] if pos is None else snap["linhas_hash"][pos]
+    # soma em uint64 (dá a volta sem perder nada): não depende da ordem das linhas nem da versão
+    _, sel, termos, _, _ = chave_figuras(0, filtros, "")
+    return impressao(int(h.sum(dtype=np.uint64)), len(h), str(pd.Timestamp.now().date()), sel, termos, opcoes)
+
 # URLs dos Temas
 THEME_FLATLY = "https://cdn.jsdelivr.net/npm/bootswatch@5.3.2/dist/flatly/bootstrap.min.css"
 THEME_DARKLY = "https://cdn.jsdelivr.net/npm/bootswatch@5.3.2/dist/darkly/bootstrap.min.css"
 
 # =========================
-# 3) CARGA INICIAL
+# 3) CARGA INICIAL + SINCRONIZAÇÃO INCREMENTAL
+# =========================
+_sync_lock = threading.Lock()
+_sync = {
+    "bruto": None,            # último snapshot lido (antes do preparar_campos), 1 linha por documentid
+    "wm_id": None,            # maior ID do ML001072 já lido
+    "wm_data": None,          # GETDATE() do servidor no início da última leitura
+    "ultimo_completo": None,  # quando rodou a última carga completa
+}
+
+def _ler_marca_dagua():
+    wm = db.ler_sql(sql_marca_dagua, timeout=15)
+    return wm["WM_ID"].iloc[0], pd.Timestamp(wm["WM_DATA"].iloc[0])
+
+def _mesclar_delta(bruto: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    if delta.empty:
+        return bruto
+    mantidos = bruto[~bruto["documentid"].isin(delta["documentid"])]
+    return (
+        pd.concat([mantidos, delta], ignore_index=True)
+        .sort_values("documentid", ascending=False, kind="stable")
+        .reset_index(drop=True)
+    )
+
+def _so_mudancas(bruto: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Tira do delta as linhas idênticas às do snapshot (a folga da marca d'água relê várias)."""
+    if delta.empty:
+        return delta
+    anteriores = bruto[bruto["documentid"].isin(delta["documentid"])]
+    if list(anteriores.columns) != list(delta.columns):
+        return delta
+    hash_ant = dict(zip(anteriores["documentid"], pd.util.hash_pandas_object(anteriores, index=False)))
+    hash_novo = pd.util.hash_pandas_object(delta, index=False).to_numpy()
+    mudou = [hash_ant.get(d) != h for d, h in zip(delta["documentid"], hash_novo)]
+    return delta[mudou]
+
+def sincronizar_chamados(forcar_completo=False):
+    """Busca no banco só o que mudou desde a última marca d'água.
+
+    Devolve (df preparado, documentids alterados); alterados=None quando foi carga completa.
+    """
+    with _sync_lock:
+        agora = pd.Timestamp.now()
+        completo = (
+            forcar_completo
+            or not SYNC_INCREMENTAL
+            or _sync["bruto"] is None
+            or pd.isna(_sync["wm_id"])
+            or agora - _sync["ultimo_completo"] >= pd.Timedelta(minutes=SYNC_COMPLETO_MIN)
+        )
+
+        wm_id, wm_data = _ler_marca_dagua() if SYNC_INCREMENTAL else (None, None)
+
+        if completo:
+            bruto = db.ler_sql(sql_query)
+            alterados = None
+            _sync["ultimo_completo"] = agora
+        else:
+            desde = (_sync["wm_data"] - pd.Timedelta(minutes=SYNC_MARGEM_MIN)).to_pydatetime()
+            delta = db.ler_sql(sql_delta, params=[int(_sync["wm_id"]), desde, desde, desde])
+            delta = _so_mudancas(_sync["bruto"], delta)
+            bruto = _mesclar_delta(_sync["bruto"], delta)
+            alterados = delta["documentid"].tolist()
+
+        _sync.update(bruto=bruto, wm_id=wm_id, wm_data=wm_data)
+
+    if alterados == []:
+        return None, alterados
+    return preparar_campos(bruto.copy()), alterados
+
+# =========================
+# SNAPSHOT COMPARTILHADO (1 DataFrame preparado por versão, p/ todas as sessões)
+# =========================
+REFRESH_MIN_S = 60          # intervalo mínimo entre idas ao banco (agendador + carga do boot)
+REFRESH_PERIODO_S = 120     # agendador: 1 sincronização a cada ~2 min, não importa quantas abas
+REFRESH_JITTER_S = 15
+VERSAO_CHECK_MS = 15 * 1000  # as abas só perguntam a versão (não vai ao banco)
+
+_refresh_lock = threading.Lock()
+_snapshot = {"versao": 0, "df": None, "indices": None, "prefixos": None, "texto": None, "cubo": None, "linhas_hash": None, "alterados": None, "carregado_em": None, "verificado_em": None}
+
+def obter_snapshot() -> dict:
+    # o df publicado nunca é alterado no lugar: cada versão nova troca o dict inteiro
+    return _snapshot
+
+# o que mudou em cada versão (p/ o grid trocar só essas linhas no navegador)
+HISTORICO_VERSOES = 30
+_historico_lock = threading.Lock()
+_historico = OrderedDict()   # versão -> (documentids alterados, linhas deles na versão anterior)
+
+def documentos_alterados(anterior: dict, df: pd.DataFrame, hashes: np.ndarray) -> list:
+    """documentids novos, alterados ou removidos entre o snapshot anterior e `df` (pelo hash das linhas)."""
+    docs_ant = pd.Index(anterior["df"]["documentid"].to_numpy())
+    docs = df["documentid"].to_numpy()
+    pos = docs_ant.get_indexer(docs)
+    igual = (pos >= 0) & (anterior["linhas_hash"][np.maximum(pos, 0)] == hashes)
+    removidos = docs_ant[~docs_ant.isin(docs)]
+    return docs[~igual].tolist() + removidos.tolist()
+
+def _registrar_historico(versao: int, anterior: dict, alterados):
+    with _historico_lock:
+        if alterados is None or anterior["df"] is None:
+            _historico.clear()   # sem referência: quem estava antes recarrega o grid inteiro
+            return
+        ant = anterior["df"]
+        _historico[versao] = (alterados, ant[ant["documentid"].isin(alterados)])
+        while len(_historico) > HISTORICO_VERSOES:
+            _historico.popitem(last=False)
+
+def publicar_snapshot(df: pd.DataFrame, alterados=None, carregado_em=None, texto=None):
+    global _snapshot
+    agora = carregado_em or pd.Timestamp.now()
+    indices = construir_indices(df)
+    if texto is None:
+        texto = construir_indice_texto(df)          # também atualiza as assinaturas MinHash
+        df["INCIDENTE"] = agrupar_duplicados(df)
+    for col in COLS_DERIVADAS_TEXTO:
+        if col not in df.columns:
+            df[col] = np.nan                         # snapshot do disco sem a coluna: sai na próxima carga
+    sugerir_categorias(df)
+    hashes = hash_linhas(df)
+    anterior = _snapshot
+    if anterior["df"] is not None:
+        # a diferença sai do hash das linhas: pega também quem só mudou de incidente
+        alterados = documentos_alterados(anterior, df, hashes)
+    invalidar_detalhes(alterados)
+    _registrar_historico(anterior["versao"] + 1, anterior, alterados)
+    _snapshot = {
+        "versao": anterior["versao"] + 1,
+        "df": df,
+        "indices": indices,
+        "prefixos": construir_prefixos(indices["f_num_solicitacao"]),
+        "texto": texto,
+        "cubo": construir_cubo(df),
+        "linhas_hash": hashes,
+        "alterados": alterados,
+        "carregado_em": agora,
+        "verificado_em": agora,
+    }
+
+def atualizar_snapshot(forcar=False) -> dict:
+    """Único caminho que vai ao banco. Se outra thread já está atualizando, só devolve o atual."""
+    snap = obter_snapshot()
+    recente = (
+        snap["verificado_em"] is not None
+        and (pd.Timestamp.now() - snap["verificado_em"]).total_seconds() < REFRESH_MIN_S
+    )
+    if (recente and not forcar) or not _refresh_lock.acquire(blocking=False):
+        return obter_snapshot()
+    try:
+        df, alterados = sincronizar_chamados(forcar_completo=forcar)
+        if df is None:
+            # nada mudou: mesma versão, só renova o "verificado em"
+            _snapshot["verificado_em"] = pd.Timestamp.now()
+        else:
+            publicar_snapshot(df, alterados)
+            _disco_pool.submit(salvar_snapshot_disco, obter_snapshot())
+            agendador_previsao.pedir_execucao()
+            if not _sugestao["modelos"]:
+                agendador_sugestao.pedir_execucao()   # ainda sem modelo: treina já com os textos desta carga
+    finally:
+        _refresh_lock.release()
+    return obter_snapshot()
+
+# =========================
+# SNAPSHOT EM DISCO (Arrow IPC: o boot lê o arquivo e já atende; o banco sincroniza depois)
+# =========================
+SNAPSHOT_ARQUIVO = os.path.join(tempfile.gettempdir(), "painel_chamados_snapshot.arrow")
+SNAPSHOT_TEXTO = SNAPSHOT_ARQUIVO + ".texto.npz"   # índice da busca no texto (é o passo caro de remontar)
+SNAPSHOT_FORMATO = "2"   # mude quando preparar_campos mudar as colunas: arquivo antigo é ignorado
+
+_disco_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot_disco")
+# mesmo registro de falhas do Agendador: o painel segue com o arquivo anterior (ou sem nenhum)
+_disco_status = {"gravacoes": 0, "falhas": 0, "ultimo_erro": None}
+
+def salvar_snapshot_disco(snap: dict):
+    """Grava o df preparado (categorias inclusas) num arquivo temporário e troca pelo atual."""
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        return
+    tmp = f"{SNAPSHOT_ARQUIVO}.{os.getpid()}.tmp"
+    tmp_texto = f"{SNAPSHOT_TEXTO}.{os.getpid()}.tmp.npz"
+    try:
+        # conversão dentro do try: coluna object com tipos misturados falha aqui (ArrowInvalid/ArrowTypeError)
+        tabela = pa.Table.from_pandas(snap["df"], preserve_index=False)
+        meta = dict(tabela.schema.metadata or {})
+        meta[b"painel_formato"] = SNAPSHOT_FORMATO.encode()
+        meta[b"painel_carregado_em"] = snap["carregado_em"].isoformat().encode()
+        # sem compressão: o arquivo pode ser lido direto (ou mapeado) sem descompactar
+        feather.write_feather(tabela.replace_schema_metadata(meta), tmp, compression="uncompressed")
+        np.savez(tmp_texto, carregado_em=meta[b"painel_carregado_em"].decode(), **snap["texto"])
+        os.replace(tmp_texto, SNAPSHOT_TEXTO)
+        os.replace(tmp, SNAPSHOT_ARQUIVO)
+        _disco_status["gravacoes"] += 1
+    except Exception as exc:
+        _disco_status["falhas"] += 1
+        _disco_status["ultimo_erro"] = f"{type(exc).__name__}: {exc}"
+        traceback.print_exc()
+        for arq in (tmp, tmp_texto):
+            if os.path.exists(arq):
+                os.remove(arq)
+
+def carregar_snapshot_disco() -> bool:
+    """Publica o último snapshot gravado; False se não há arquivo válido (aí o boot vai ao banco)."""
+    try:
+        import pyarrow.feather as feather
+        # lido para a memória (não mapeado): no Windows arquivo mapeado não pode ser substituído
+        tabela = feather.read_table(SNAPSHOT_ARQUIVO, memory_map=False)
+    except (ImportError, OSError):
+        return False
+    meta = tabela.schema.metadata or {}
+    if meta.get(b"painel_formato") != SNAPSHOT_FORMATO.encode():
+        return False
+    df = tabela.to_pandas()
+    if any(col not in df.columns for col in [*FILTROS_SIDEBAR.values(), *CUBO_DIMS, "documentid", "ID"]):
+        return False
+
+    # índice de texto gravado junto (mesmo carregado_em). Se não bater, sobe com índice vazio:
+    # remontar leria os textos no banco durante o import (e o boot pelo disco existe p/ não depender dele);
+    # INCIDENTE/sugestões vêm do próprio arquivo e a carga em segundo plano remonta tudo
+    texto = None
+    try:
+        with np.load(SNAPSHOT_TEXTO) as z:
+            if str(z["carregado_em"]) == meta[b"painel_carregado_em"].decode():
+                texto = {k: z[k] for k in z.files if k != "carregado_em"}
+                texto["tam_medio"] = float(texto["tam_medio"])
+    except (OSError, KeyError, ValueError):
+        pass
+    if texto is None:
+        texto = indice_texto_vazio(len(df))
+    publicar_snapshot(df, carregado_em=pd.Timestamp(meta[b"painel_carregado_em"].decode()), texto=texto)
+    return True
+
+# =========================
+# PUSHDOWN: consulta só com as linhas do filtro (cache curto por versão + filtros)
+# =========================
+_filtrados_lock = threading.Lock()
+_filtrados = OrderedDict()
+
+def ler_filtrado(snap: dict, filtros: dict) -> pd.DataFrame:
+    where, params = where_parametrizado(SQL_FILTRO_EXPR, filtros)
+    chave = (snap["versao"], where, tuple(params))
+    with _filtrados_lock:
+        if chave in _filtrados:
+            _filtrados.move_to_end(chave)
+            return _filtrados[chave]
+
+    sql = SQL_CHAMADOS.format(colunas=SQL_COLUNAS, cte_alterados="", filtro_docs="", filtro_proces="", filtro_where=where)
+    dff = preparar_campos(db.ler_sql(sql, params=params, preparar=True))
+    # colunas calculadas na publicação (incidente, sugestões) só existem no snapshot: vêm de lá
+    # pelo documentid (chamado mais novo que o snapshot fica NaN até a próxima versão)
+    derivadas = snap["df"].set_index("documentid")[COLS_DERIVADAS_TEXTO]
+    dff = dff.join(derivadas, on="documentid")
+
+    with _filtrados_lock:
+        _filtrados[chave] = dff
+        while len(_filtrados) > 8:
+            _filtrados.popitem(last=False)
+    return dff
+
+def idade_snapshot(snap: dict) -> str:
+    if snap["verificado_em"] is None:
+        return "—"
+    seg = int((pd.Timestamp.now() - snap["verificado_em"]).total_seconds())
+    if seg < 60:
+        return "agora"
+    if seg < 3600:
+        return f"há {seg // 60} min"
+    return f"há {seg // 3600} h {seg % 3600 // 60:02d} min"
+
+# =========================
+# SUGESTÃO DE GRUPO/SUBGRUPO (TF-IDF da descrição + regressão softmax; treino em segundo plano)
 # =========================
-df0 = pd.read_sql(sql_query, conn)
-df0 = preparar_campos(df0)
+SUGESTAO_ALVOS = {"input1": "SUGESTAO_GRUPO", "input2": "SUGESTAO_SUBGRUPO"}
+COLS_DERIVADAS_TEXTO = ["INCIDENTE", *SUGESTAO_ALVOS.values(), "CONFIANCA_SUGESTAO"]
+SUGESTAO_MIN_EXEMPLOS = 20        # classe com menos exemplos que isso não é sugerida
+SUGESTAO_TREINO_MAX = 60_000      # finalizados mais recentes usados no treino
+SUGESTAO_PERIODO_S = 60 * 60      # re-treino (parte dos pesos anteriores: é rápido)
+SUGESTAO_MIN_DF = 3               # termo em menos descrições que isso não vira feature
+SUGESTAO_MAX_TERMOS = 5000        # teto de features: pesos = termos x classes, densos
+
+_sugestao = {"termos": None, "idf": None, "modelos": {}, "treinado_em": None, "exemplos": 0}
+_SEM_TERMOS = (np.empty(0, np.int32), np.empty(0, np.int64))
+
+def _contagens_descricoes(docs) -> sp.csr_matrix:
+    # colunas = ids do vocabulário do painel (compartilhado com a busca); o modelo escolhe as suas
+    desc = _texto_cache["desc"]
+    return matriz_termos([desc.get(d, _SEM_TERMOS) for d in docs], len(_texto_cache["vocab"]))
+
+def sugerir_categorias(df: pd.DataFrame):
+    """Grupo/Subgrupo sugeridos + confiança (%) p/ os chamados em aberto, num lote por alvo."""
+    modelo = _sugestao
+    if not modelo["modelos"]:
+        return   # ainda sem treino: fica o que já estava (ex.: snapshot do disco)
+    abertos = np.flatnonzero(df["END_DATE"].isna().to_numpy())
+    x = tfidf(_contagens_descricoes(df["documentid"].to_numpy()[abertos])[:, modelo["termos"]], modelo["idf"])
+    com_texto = np.diff(x.indptr) > 0
+    confianca = np.ones(len(abertos))
+    for col, destino in SUGESTAO_ALVOS.items():
+        m = modelo["modelos"][col]
+        classe, prob = prever(x, m["w"], m["b"])
+        valores = np.full(len(df), None, dtype=object)
+        valores[abertos[com_texto]] = np.asarray(m["classes"], dtype=object)[classe[com_texto]]
+        df[destino] = valores
+        confianca = np.minimum(confianca, prob)
+    pct = np.full(len(df), np.nan)
+    pct[abertos[com_texto]] = np.round(confianca[com_texto] * 100)
+    df["CONFIANCA_SUGESTAO"] = pct
+
+def treinar_sugestoes():
+    """Re-treina com os finalizados do snapshot atual e republica com as sugestões novas."""
+    global _sugestao
+    snap = obter_snapshot()
+    if snap["df"] is None:
+        return
+    desc = _texto_cache["desc"]
+    base = snap["df"][snap["df"]["END_DATE"].notna()]
+    base = base[base["documentid"].isin(list(desc))].head(SUGESTAO_TREINO_MAX)   # df vem do mais recente p/ o mais antigo
+    if len(base) < SUGESTAO_MIN_EXEMPLOS:
+        return   # textos ainda não carregados (boot pelo disco): tenta no próximo ciclo
+
+    contagens = _contagens_descricoes(base["documentid"].to_numpy())
+    termos = selecionar_termos(contagens, SUGESTAO_MIN_DF, SUGESTAO_MAX_TERMOS)
+    contagens = contagens[:, termos]
+    idf = ajustar_idf(contagens)
+    x = tfidf(contagens, idf)
+    anterior = _sugestao["modelos"]
+    modelos = {}
+    for col in SUGESTAO_ALVOS:
+        rotulos = base[col].astype("string").to_numpy(dtype=object, na_value=None)
+        qtd = pd.Series(rotulos).value_counts()
+        classes = sorted(qtd.index[qtd >= SUGESTAO_MIN_EXEMPLOS].tolist())
+        if len(classes) < 2:
+            return
+        y = pd.Index(classes).get_indexer(rotulos)
+        ok = y >= 0
+        ant = anterior.get(col)
+        inicial = pesos_para(ant["w"], ant["b"], ant["classes"], classes, _sugestao["termos"], termos) if ant else None
+        w, b = treinar(x[ok], y[ok], len(classes), pesos_iniciais=inicial, max_iter=40 if ant else 150)
+        modelos[col] = {"w": w, "b": b, "classes": classes}
+    _sugestao = {"termos": termos, "idf": idf, "modelos": modelos, "treinado_em": pd.Timestamp.now(), "exemplos": len(base)}
+
+    # mesmos dados, sugestões novas: vira versão nova (o grid recebe só as linhas que mudaram)
+    with _refresh_lock:
+        snap = obter_snapshot()
+        df = snap["df"].copy()
+        sugerir_categorias(df)
+        if np.array_equal(hash_linhas(df), snap["linhas_hash"]):
+            return
+        publicar_snapshot(df, carregado_em=snap["carregado_em"], texto=snap["texto"])
+    _disco_pool.submit(salvar_snapshot_disco, obter_snapshot())
 
-options_solicitante = opts_from_series(df0.get("nome_solicitante"))
-options_mes = opts_from_series(df0.get("MES_EMISSAO"))
-options_input1 = opts_from_series(df0.get("input1"))
-options_input2 = opts_from_series(df0.get("input2"))
-options_atribuicao = opts_from_series(df0.get("nm_atribuicao"))
-options_numsol = opts_from_series(df0.get("numSolFluig"))
-options_status = opts_from_series(df0.get("STATUS"))
-options_tecnico = opts_from_series(df0.get("nm_tecAtual"))
+# =========================
+# PREVISÃO DE VOLUME POR GRUPO (statsmodels em segundo plano; o callback só lê o cache)
+# =========================
+PREVISAO_TOTAL = "(todos)"       # série do total: previsão própria, melhor que somar os grupos
+PREVISAO_Z = 1.2816              # faixa de 80%
+PREVISAO_CACHE_MAX = 2000
+PREVISAO_PERIODO_S = 60 * 60     # além do pedido após cada carga: pega a virada do mês
+
+# 1 thread só, fora das requisições. Processo não: fork a partir de um processo com threads
+# (agendadores, export, disco) pode travar em lock herdado, e spawn/forkserver reimportam o painel
+_previsao_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="previsao")
+
+_previsoes = OrderedDict()   # (grupo, impressão da série) -> (média, desvio): série igual => ajuste reaproveitado
+_previsao = {"chave": None, "inicio": None, "grupos": {}, "impressao": None}
+
+def series_mensais(df: pd.DataFrame) -> dict:
+    """Grupo -> contagens dos meses fechados (do 1º mês com chamado até o mês passado) + o total."""
+    mes = df["dt_emissao"].dt.to_period("M")
+    atual = pd.Timestamp.now().to_period("M")
+    ok = mes.notna() & (mes < atual)
+    if not ok.any():
+        return {}
+    tab = df[ok].groupby([df["input1"][ok], mes[ok]], observed=True).size().unstack(fill_value=0)
+    tab = tab.reindex(columns=pd.period_range(tab.columns.min(), atual - 1, freq="M"), fill_value=0)
+    series = {PREVISAO_TOTAL: tab.to_numpy().sum(axis=0), **dict(zip(tab.index.astype(str), tab.to_numpy()))}
+    return {g: s[np.argmax(s > 0):] for g, s in series.items() if s.any()}
+
+def atualizar_previsoes():
+    """Reajusta (no pool) só os grupos cuja série mudou e troca o dict publicado de uma vez."""
+    global _previsao
+    snap = obter_snapshot()
+    if snap["df"] is None:
+        return
+    mes_atual = pd.Timestamp.now().to_period("M")
+    if _previsao["chave"] == (snap["versao"], mes_atual):
+        return
+    series = series_mensais(snap["df"])
+    chaves = {g: (g, impressao(str(mes_atual), s)) for g, s in series.items()}
+    faltam = [g for g, k in chaves.items() if k not in _previsoes]
+    for g, resultado in zip(faltam, _previsao_pool.map(ajustar, [series[g] for g in faltam])):
+        _previsoes[chaves[g]] = resultado
+    for k in chaves.values():
+        _previsoes.move_to_end(k)
+    while len(_previsoes) > PREVISAO_CACHE_MAX:
+        _previsoes.popitem(last=False)
+    _previsao = {
+        "chave": (snap["versao"], mes_atual),
+        "inicio": mes_atual,
+        "grupos": {g: _previsoes[k] for g, k in chaves.items()},
+        "impressao": impressao(mes_atual, sorted(chaves.values())),
+    }
+
+def faixa_previsao(filtros: dict):
+    """Média e faixa dos próximos meses p/ os grupos selecionados (todos, sem filtro).
+
+    Só quando o filtro é de grupo (ou nenhum): com outros filtros o gráfico não é a soma das séries previstas.
+    """
+    outros = [fid for fid in FILTROS_SIDEBAR if fid != "f_input1"]
+    if any(_normalizar_alvo(FILTROS_SIDEBAR[fid], filtros.get(fid)) for fid in outros) \
+            or termos_da_consulta(filtros.get(FILTRO_TEXTO)):
+        return None
+    prev = _previsao
+    grupos = _normalizar_alvo("input1", filtros.get("f_input1")) or [PREVISAO_TOTAL]
+    partes = [prev["grupos"][g] for g in grupos if g in prev["grupos"]]
+    if not partes:
+        return None
+    # grupos previstos em separado: médias somam, variâncias também (independência);
+    # algum grupo sem desvio (história curta) => soma sem desvio => só a linha da média
+    media = np.sum([m for m, _ in partes], axis=0)
+    dp = np.sqrt(np.sum([d ** 2 for _, d in partes], axis=0))
+    return {
+        "PERIODO": pd.period_range(prev["inicio"], periods=HORIZONTE, freq="M").to_timestamp(),
+        "media": np.maximum(media, 0),
+        "inf": np.maximum(media - PREVISAO_Z * dp, 0),
+        "sup": np.maximum(media + PREVISAO_Z * dp, 0),
+        "impressao": prev["impressao"],
+    }
+
+agendador_previsao = Agendador("previsao", atualizar_previsoes, PREVISAO_PERIODO_S, 5 * 60)
+
+# treino do sugeridor: thread própria, fora das requisições (sem textos no cache ainda, não treina;
+# atualizar_snapshot pede o 1º treino depois da carga que os traz)
+agendador_sugestao = Agendador("sugestao", treinar_sugestoes, SUGESTAO_PERIODO_S, 5 * 60)
+
+# boot: com snapshot em disco o servidor sobe na hora e a carga completa roda em segundo plano.
+# banco fora no boot: a falha fica registrada como nas outras tarefas e o agendador tenta de novo
+if carregar_snapshot_disco():
+    carga_inicial = Agendador("carga_inicial", lambda: atualizar_snapshot(forcar=True), 0)
+    threading.Thread(target=carga_inicial.executar, daemon=True, name="carga_inicial").start()
+else:
+    atualizar_snapshot(forcar=True)
+df0 = obter_snapshot()["df"]
+
+# única thread que sincroniza com o banco daqui pra frente
+agendador = Agendador("chamados", atualizar_snapshot, REFRESH_PERIODO_S, REFRESH_JITTER_S).iniciar()
+# previsões: 1ª já com o snapshot do boot; depois, a cada carga nova (pedir_execucao) e de hora em hora
+agendador_previsao.iniciar(imediato=True)
+agendador_sugestao.iniciar(imediato=True)
+
+indices0 = obter_snapshot()["indices"]
+
+# tudo que entra no dict de filtros (dropdowns + busca no texto), na ordem dos States dos callbacks
+IDS_FILTROS = list(FILTROS_SIDEBAR) + [FILTRO_TEXTO]
+
+# Nº Solicitação cresce sem limite: as opções vêm da busca por prefixo (opcoes_numsol), não da lista toda
+FILTROS_COM_OPCOES = [fid for fid in FILTROS_SIDEBAR if fid != "f_num_solicitacao"]
+
+def opcoes_filtros(indices: dict) -> dict:
+    return {fid: opts_from_indice(indices[fid]) for fid in FILTROS_COM_OPCOES}
+
+_opcoes0 = opcoes_filtros(indices0)
+options_solicitante = _opcoes0["f_solicitante"]
+options_mes = _opcoes0["f_mes_emissao"]
+options_input1 = _opcoes0["f_input1"]
+options_input2 = _opcoes0["f_input2"]
+options_atribuicao = _opcoes0["f_atribuicao"]
+options_numsol = [{"label": v, "value": v} for v in buscar_prefixo(obter_snapshot()["prefixos"], "")]
+options_status = _opcoes0["f_status"]
+options_tecnico = _opcoes0["f_tecnico"]
 
 preferidas = [
-    "STATUS", "NUM_PROCES", "START_DATE", "END_DATE", "SLA_PROCESSO",
+    "STATUS", "NUM_PROCES", "INCIDENTE", "START_DATE", "END_DATE", "SLA_PROCESSO", "SLA_PROCESSO_HU",
     "MES_EMISSAO", "nome_solicitante", "nm_atribuicao",
-    "nm_tecAtual", "input1", "input2", "lb_impacto",
-    "descSolicitante", "orientacao", "solucao"
+    "nm_tecAtual", "input1", "input2", "SUGESTAO_GRUPO", "SUGESTAO_SUBGRUPO", "CONFIANCA_SUGESTAO", "lb_impacto",
 ]
 cols0 = [c for c in preferidas if c in df0.columns]
 cols0 += [c for c in df0.columns if c not in cols0]
-view0 = df0[cols0].copy()
-rowData0 = view0.to_dict("records")
-columnDefs0 = [{"headerName": c, "field": c, "filter": True, "sortable": True, "resizable": True} for c in view0.columns]
+columnDefs0 = [
+    {
+        "headerName": c, "field": c, "sortable": True, "resizable": True,
+        "filter": "agNumberColumnFilter" if pd.api.types.is_numeric_dtype(df0[c]) else "agTextColumnFilter",
+        "filterParams": {"buttons": ["apply", "reset"], "maxNumConditions": 1},
+    }
+    for c in cols0
+]
+
+# =========================
+# GRID: ROW MODEL INFINITO (o navegador só pede o bloco que está na tela)
+# =========================
+GRID_BLOCO = 100
+
+def _mascara_filtro_grid(serie: pd.Series, f: dict) -> pd.Series:
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # avalia o filtro uma vez por categoria e espalha pelos códigos
+        cats = pd.Series(serie.cat.categories.astype(object))
+        ok = np.append(_mascara_filtro_grid(cats, f).to_numpy(bool), _mascara_filtro_grid(pd.Series([None]), f).iloc[0])
+        return pd.Series(ok[serie.cat.codes.to_numpy()], index=serie.index)
+
+    tipo = f.get("type", "contains")
+    if tipo == "blank":
+        return serie.isna() | serie.astype(str).str.strip().eq("")
+    if tipo == "notBlank":
+        return serie.notna() & serie.astype(str).str.strip().ne("")
+
+    if f.get("filterType") == "number":
+        num = pd.to_numeric(serie, errors="coerce")
+        v = f.get("filter")
+        ops = {
+            "equals": lambda: num == v,
+            "notEqual": lambda: num != v,
+            "greaterThan": lambda: num > v,
+            "greaterThanOrEqual": lambda: num >= v,
+            "lessThan": lambda: num < v,
+            "lessThanOrEqual": lambda: num <= v,
+            "inRange": lambda: num.between(v, f.get("filterTo")),
+        }
+        return ops.get(tipo, lambda: pd.Series(True, index=serie.index))().fillna(False)
+
+    txt = serie.astype("string").fillna("").str.lower()
+    v = str(f.get("filter") or "").lower()
+    ops = {
+        "contains": lambda: txt.str.contains(v, regex=False),
+        "notContains": lambda: ~txt.str.contains(v, regex=False),
+        "equals": lambda: txt == v,
+        "notEqual": lambda: txt != v,
+        "startsWith": lambda: txt.str.startswith(v),
+        "endsWith": lambda: txt.str.endswith(v),
+    }
+    return ops.get(tipo, lambda: pd.Series(True, index=serie.index))()
+
+def _mascara_coluna_grid(serie: pd.Series, f: dict) -> pd.Series:
+    if "conditions" not in f:
+        return _mascara_filtro_grid(serie, f)
+    masks = [_mascara_filtro_grid(serie, c) for c in f["conditions"]]
+    mask = masks[0]
+    for m in masks[1:]:
+        mask = (mask | m) if f.get("operator") == "OR" else (mask & m)
+    return mask
+
+def filtrar_grid(dff: pd.DataFrame, filter_model: dict) -> pd.DataFrame:
+    for col, f in (filter_model or {}).items():
+        if col in dff.columns:
+            dff = dff[_mascara_coluna_grid(dff[col], f)]
+    return dff
+
+def ordenar_grid(dff: pd.DataFrame, sort_model: list) -> pd.DataFrame:
+    sort_model = [s for s in (sort_model or []) if s.get("colId") in dff.columns]
+    if not sort_model:
+        return dff
+    return dff.sort_values(
+        [s["colId"] for s in sort_model],
+        ascending=[s.get("sort") != "desc" for s in sort_model],
+        na_position="last",
+        kind="stable",
+    )
+
+# =========================
+# GRID: ATUALIZAÇÃO POR DIFERENÇA (versão nova troca só as linhas que mudaram)
+# =========================
+# o row model infinito não aceita rowTransaction: as linhas alteradas vão no store_grid e o
+# navegador troca os dados dos nós já carregados (getRowNode(id).setData), sem recarregar blocos
+GRID_DELTA_MAX = 500   # acima disso sai mais barato o grid pedir os blocos de novo
+
+def delta_grid(snap: dict, filtros: dict, versao_cliente) -> list:
+    """Linhas (cols0) que mudaram entre a versão do navegador e a atual, dentro do filtro.
+
+    None = não dá p/ trocar no lugar (linha entrou/saiu do filtro, histórico perdido, busca
+    no texto ativa): o grid recarrega os blocos.
+    """
+    if versao_cliente is None or str(filtros.get(FILTRO_TEXTO) or "").strip():
+        return None
+    if versao_cliente == snap["versao"]:
+        return []
+    with _historico_lock:
+        entradas = [_historico.get(v) for v in range(versao_cliente + 1, snap["versao"] + 1)]
+    if any(e is None for e in entradas):
+        return None
+
+    # estava no filtro na versão do navegador? vale a linha de antes da 1ª versão que alterou o documento
+    antes = {}
+    for alterados, anteriores in entradas:
+        dentro = set(aplicar_filtros(anteriores, filtros)["documentid"].tolist())
+        for d in alterados:
+            antes.setdefault(d, d in dentro)
+    if len(antes) > GRID_DELTA_MAX:
+        return None
+
+    df = snap["df"]
+    agora = aplicar_filtros(df[df["documentid"].isin(list(antes))], filtros)
+    if set(agora["documentid"].tolist()) != {d for d, dentro in antes.items() if dentro}:
+        return None   # posições das linhas mudaram
+    return agora[cols0].to_dict("records")
+
+# =========================
+# EXPORT EM STREAMING (blocos do snapshot -> arquivo; memória constante)
+# =========================
+EXPORT_FORMATOS = ["xlsx", "csv", "parquet"]
+EXPORT_BLOCO = 5000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "painel_chamados_export")
+EXPORT_VALIDADE_S = 3600
+
+_exports = {}
+_export_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+
+def linhas_para_exportar(snap: dict, filtros: dict, filter_model: dict):
+    """(frame base, posições das linhas) sem copiar o snapshot; o export lê em blocos."""
+    if PUSHDOWN_SQL and any(filtros.get(fid) for fid in SQL_FILTRO_EXPR):
+        base = ler_filtrado(snap, filtros).reset_index(drop=True)
+        pos = np.flatnonzero(base.index.isin(_so_achados_no_texto(snap, aplicar_filtros(base, filtros), filtros).index))
+    else:
+        base = snap["df"]
+        pos = linhas_snapshot(snap, filtros)
+        if pos is None:
+            pos = np.arange(len(base))
+    for col, f in (filter_model or {}).items():
+        if col in base.columns:
+            pos = pos[_mascara_coluna_grid(base[col].iloc[pos], f).to_numpy(bool)]
+    return base, pos
+
+EXPORT_COM_TEXTO = True   # junta descrição/orientação/solução/observação (lidas do banco por bloco)
+cols_export = cols0 + (COLS_DETALHE if EXPORT_COM_TEXTO else [])
+
+def _blocos(base: pd.DataFrame, pos: np.ndarray, job: dict):
+    for i in range(0, len(pos), EXPORT_BLOCO):
+        bloco = base.iloc[pos[i:i + EXPORT_BLOCO]][cols0]
+        if EXPORT_COM_TEXTO:
+            textos = ler_textos(bloco["documentid"], ler_tudo=False).astype({"documentid": str}).set_index("documentid")
+            textos = textos[COLS_DETALHE].astype("string").reindex(bloco["documentid"].astype(str))
+            bloco = pd.concat([bloco.reset_index(drop=True), textos.reset_index(drop=True)], axis=1)
+        yield bloco
+        job["progresso"] = min(1.0, (i + EXPORT_BLOCO) / max(len(pos), 1))
+
+def _escrever_csv(caminho, base, pos, job):
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(";".join(cols_export) + "\n")
+        for bloco in _blocos(base, pos, job):
+            bloco.to_csv(f, sep=";", decimal=",", index=False, header=False, date_format="%d/%m/%Y %H:%M")
+
+def _escrever_xlsx(caminho, base, pos, job):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)   # linhas vão direto p/ o XML temporário, sem montar a planilha em memória
+    ws = wb.create_sheet("Dados")
+    ws.append(cols_export)
+    for bloco in _blocos(base, pos, job):
+        bloco = bloco.astype(object).where(bloco.notna(), None)
+        for linha in bloco.itertuples(index=False, name=None):
+            ws.append(linha)
+    wb.save(caminho)
+
+def _escrever_parquet(caminho, base, pos, job):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # schema 1x, dos tipos das colunas inteiras (não do 1º bloco): coluna toda nula no 1º bloco
+    # (ex.: sugestão, só preenchida nos abertos) viraria tipo "null" e os blocos seguintes não cabem
+    vazio = base.iloc[:0][cols0]
+    if EXPORT_COM_TEXTO:
+        vazio = vazio.assign(**{c: pd.Series(dtype="string") for c in COLS_DETALHE})
+    schema = pa.Schema.from_pandas(vazio, preserve_index=False)
+    for i, campo in enumerate(schema):
+        if pa.types.is_null(campo.type):
+            schema = schema.set(i, pa.field(campo.name, pa.string()))
+
+    with pq.ParquetWriter(caminho, schema) as escritor:
+        for bloco in _blocos(base, pos, job):
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=schema, preserve_index=False))
+
+_ESCRITORES = {"csv": _escrever_csv, "xlsx": _escrever_xlsx, "parquet": _escrever_parquet}
+
+def _limpar_exports():
+    agora = time.time()
+    for job_id, job in list(_exports.items()):
+        if agora - job["criado"] > EXPORT_VALIDADE_S:
+            _exports.pop(job_id, None)
+            if os.path.exists(job["arquivo"]):
+                os.remove(job["arquivo"])
+
+def _rodar_export(job: dict, base, pos, formato):
+    try:
+        _ESCRITORES[formato](job["arquivo"], base, pos, job)
+        job["progresso"], job["pronto"] = 1.0, True
+    except Exception as exc:
+        job["erro"] = str(exc)
+
+def iniciar_export(base: pd.DataFrame, pos: np.ndarray, formato: str) -> str:
+    _limpar_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    nome = f"suporte_tecnico.{formato}"
+    job = {
+        "nome": nome, "arquivo": os.path.join(EXPORT_DIR, f"{job_id}.{formato}"),
+        "progresso": 0.0, "pronto": False, "erro": None, "criado": time.time(),
+    }
+    _exports[job_id] = job
+    _export_pool.submit(_rodar_export, job, base, pos, formato)
+    return job_id
 
 # =========================
 # 4) APP / LAYOUT / CSS
@@ -395,6 +2019,12 @@ sidebar = dbc.Card(
                 id="sidebar_collapse",
                 is_open=True,
                 children=[
+                    html.Div("Buscar no texto (descrição / orientação / solução)", className="text-muted small"),
+                    dcc.Input(
+                        id=FILTRO_TEXTO, type="search", debounce=0.4,
+                        placeholder="ex.: VPN, impressora, código do erro", className="form-control form-control-sm",
+                    ),
+                    html.Hr(),
                     html.Div("Solicitante", className="text-muted small"),
                     dcc.Dropdown(id="f_solicitante", options=options_solicitante, multi=True, placeholder="Selecione..."),
                     html.Hr(),
@@ -430,7 +2060,17 @@ main_content = html.Div(
         html.H4("Painel - Suporte Técnico (Fluig)", className="mb-2 text-center pt-2 fw-bold"),
         dbc.Row(
             [
-                dbc.Col(dbc.Card(id="kpi_total", className="shadow-sm w-100"), md=3),
+                dbc.Col(
+                    dbc.Card(
+                        [
+                            html.Div(id="kpi_total"),
+                            # idade dos dados: callback próprio (muda sem versão nova, fora da impressão)
+                            html.Div(id="kpi_idade", className="text-muted px-3 pb-2", style={"fontSize": "12px"}),
+                        ],
+                        className="shadow-sm w-100",
+                    ),
+                    md=3,
+                ),
                 dbc.Col(dbc.Card(id="kpi_sla", className="shadow-sm w-100"), md=3),
                 dbc.Col(dbc.Card(id="kpi_media", className="shadow-sm w-100"), md=3),
                 dbc.Col(dbc.Card(id="kpi_abertos", className="shadow-sm w-100"), md=3),
@@ -454,6 +2094,106 @@ main_content = html.Div(
             ],
             className="mt-2 g-2",
         ),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Card(
+                        [
+                            dbc.CardHeader(
+                                html.Div(
+                                    [
+                                        html.Span("Chamados em aberto por dia (backlog)", style={"fontWeight": "600"}),
+                                        dbc.RadioItems(
+                                            id="backlog_dim", inline=True, value="nm_tecAtual",
+                                            options=[{"label": rot, "value": col} for col, rot in BACKLOG_DIMS.items()],
+                                        ),
+                                    ],
+                                    className="d-flex justify-content-between align-items-center",
+                                ),
+                                style={"padding": "6px 10px"},
+                            ),
+                            dbc.CardBody(
+                                dbc.Row(
+                                    [
+                                        dbc.Col(dcc.Graph(id="g_backlog", config={"displayModeBar": False}), md=9),
+                                        dbc.Col(
+                                            [
+                                                html.Div("Situação em", className="text-muted small"),
+                                                dcc.DatePickerSingle(
+                                                    id="backlog_data", display_format="DD/MM/YYYY",
+                                                    date=pd.Timestamp.now().date(),
+                                                ),
+                                                html.Div(id="backlog_situacao", className="mt-2"),
+                                            ],
+                                            md=3,
+                                        ),
+                                    ],
+                                    className="g-2",
+                                ),
+                                style={"padding": "6px"},
+                            ),
+                        ],
+                        className="shadow-sm w-100",
+                    ),
+                    width=12,
+                ),
+            ],
+            className="mt-2 g-2",
+        ),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Card(
+                        [
+                            dbc.CardHeader(
+                                html.Div(
+                                    [
+                                        html.Span("SLA por percentil (horas úteis, finalizados)", style={"fontWeight": "600"}),
+                                        dbc.RadioItems(
+                                            id="sla_pct_dim", inline=True, value="nm_tecAtual",
+                                            options=[{"label": rot, "value": col} for col, rot in SLA_PCT_DIMS.items()],
+                                        ),
+                                    ],
+                                    className="d-flex justify-content-between align-items-center",
+                                ),
+                                style={"padding": "6px 10px"},
+                            ),
+                            dbc.CardBody(
+                                html.Div(id="sla_percentis", style={"maxHeight": "360px", "overflowY": "auto"}),
+                                style={"padding": "6px"},
+                            ),
+                        ],
+                        className="shadow-sm w-100",
+                    ),
+                    width=12,
+                ),
+            ],
+            className="mt-2 g-2",
+        ),
+        dbc.Row(
+            [
+                dbc.Col(
+                    dbc.Card(
+                        [
+                            dbc.CardHeader(
+                                html.Span(
+                                    "Prováveis duplicados (chamados com descrição parecida, abertos próximos)",
+                                    style={"fontWeight": "600"},
+                                ),
+                                style={"padding": "6px 10px"},
+                            ),
+                            dbc.CardBody(
+                                html.Div(id="duplicados", style={"maxHeight": "360px", "overflowY": "auto"}),
+                                style={"padding": "6px"},
+                            ),
+                        ],
+                        className="shadow-sm w-100",
+                    ),
+                    width=12,
+                ),
+            ],
+            className="mt-2 g-2",
+        ),
         dbc.Row(
             [
                 dbc.Col(
@@ -462,9 +2202,22 @@ main_content = html.Div(
                             [
                                 dbc.Row(
                                     [
-                                        dbc.Col(html.H6("Tabela (descSolicitante)", className="mb-0 text-center"), width=True),
+                                        dbc.Col(html.H6("Tabela (clique na linha para ver descrição e solução)", className="mb-0 text-center"), width=True),
                                         dbc.Col(
-                                            dbc.Button("Exportar XLSX", id="btn_export_xlsx", color="success", size="sm", outline=True),
+                                            html.Div(id="export_status", className="small text-muted"),
+                                            width="auto",
+                                        ),
+                                        dbc.Col(
+                                            dbc.Select(
+                                                id="export_formato",
+                                                options=[{"label": f.upper(), "value": f} for f in EXPORT_FORMATOS],
+                                                value="xlsx",
+                                                size="sm",
+                                            ),
+                                            width="auto",
+                                        ),
+                                        dbc.Col(
+                                            dbc.Button("Exportar", id="btn_export_xlsx", color="success", size="sm", outline=True),
                                             width="auto",
                                         ),
                                     ],
@@ -475,7 +2228,8 @@ main_content = html.Div(
                                     id="tbl_ag",
                                     className="ag-theme-alpine", 
                                     columnDefs=columnDefs0,
-                                    rowData=rowData0,
+                                    rowModelType="infinite",
+                                    getRowId="String(params.data.documentid)",
                                     defaultColDef={
                                         "sortable": True, "filter": True, "resizable": True,
                                         "wrapText": True, "autoHeight": True,
@@ -485,7 +2239,11 @@ main_content = html.Div(
                                         "row-even": "params.node.rowIndex % 2 === 0",
                                         "row-odd": "params.node.rowIndex % 2 === 1",
                                     },
-                                    dashGridOptions={"rowHeight": 30, "headerHeight": 32, "animateRows": False},
+                                    dashGridOptions={
+                                        "rowHeight": 30, "headerHeight": 32, "animateRows": False,
+                                        "cacheBlockSize": GRID_BLOCO, "maxBlocksInCache": 10,
+                                        "infiniteInitialRowCount": GRID_BLOCO, "rowBuffer": 0,
+                                    },
                                     style={"height": "800px", "width": "100%"},
                                 ),
                             ]
@@ -509,8 +2267,25 @@ app.layout = html.Div(
         html.Link(href=THEME_FLATLY, rel="stylesheet", id="theme_link"),
         dcc.Markdown(f"<style>{CUSTOM_CSS}</style>", dangerously_allow_html=True),
         dcc.Store(id="sidebar_state", data={"open": True}),
-        dcc.Download(id="download_xlsx"),
-        dcc.Interval(id="interval_refresh", interval=2 * 60 * 1000, n_intervals=0),
+        dcc.Store(id="export_job"),
+        dcc.Interval(id="export_poll", interval=1000, disabled=True),
+        dcc.Store(id="store_grid"),
+        dcc.Store(id="store_figuras"),
+        dcc.Store(id="store_temas", data=TEMAS_GRAFICOS),
+        dcc.Store(id="store_opcoes_versao", data=obter_snapshot()["versao"]),
+        dcc.Interval(id="interval_refresh", interval=VERSAO_CHECK_MS, n_intervals=0),
+        dcc.Store(id="store_versao", data=obter_snapshot()["versao"]),
+        dcc.Store(id="store_previsao", data=_previsao["impressao"]),
+        dcc.Store(id="store_impressao"),
+        dbc.Offcanvas(
+            html.Div(id="detalhe_corpo"),
+            id="detalhe_painel",
+            title="Chamado",
+            placement="end",
+            is_open=False,
+            scrollable=True,
+            style={"width": "520px"},
+        ),
         
         # O container Bootstrap agora está DENTRO da Div Wrapper
         dbc.Container(
@@ -548,16 +2323,44 @@ function(value) {
     document.body.classList.toggle("dark-theme", isDark);
     document.body.classList.toggle("light-theme", !isDark);
 
-    return [isDark ? darkly : flatly, isDark ? "dark-theme" : "light-theme"];
+    return [
+        isDark ? darkly : flatly,
+        isDark ? "dark-theme" : "light-theme",
+        isDark ? "ag-theme-alpine-dark" : "ag-theme-alpine",
+    ];
 }
     """,
     [
         Output("theme_link", "href"), 
-        Output("main_wrapper", "className") # <--- Alvo agora é a Div, usando className (padrão)
+        Output("main_wrapper", "className"), # <--- Alvo agora é a Div, usando className (padrão)
+        Output("tbl_ag", "className"),
     ],
     Input("theme_switch", "value")
 )
 
+# =========================
+# CALLBACK: TEMA DOS GRÁFICOS (só layout, no navegador - não recalcula nada)
+# =========================
+app.clientside_callback(
+    """
+function(figuras, isDark, temas) {
+    if (!figuras) {
+        throw window.dash_clientside.PreventUpdate;
+    }
+    const tema = isDark ? temas.escuro : temas.claro;
+    const bg = isDark ? "rgba(0,0,0,0)" : "#ffffff";
+    return figuras.map((f) => ({
+        data: f.data,
+        layout: {...f.layout, template: tema, paper_bgcolor: bg, plot_bgcolor: bg},
+    }));
+}
+    """,
+    [Output(gid, "figure") for gid in GRAFICOS],
+    Input("store_figuras", "data"),
+    Input("theme_switch", "value"),
+    State("store_temas", "data"),
+)
+
 # =========================
 # Sidebar toggle
 # =========================
@@ -579,6 +2382,36 @@ def toggle_sidebar(n, st):
 
     return is_open, col_sidebar, col_main, {"open": is_open}
 
+# =========================
+# Versão: o intervalo só pergunta se chegou versão nova (quem vai ao banco é o agendador)
+# =========================
+@app.callback(
+    Output("store_versao", "data"),
+    Output("store_previsao", "data"),
+    Input("interval_refresh", "n_intervals"),
+    State("store_versao", "data"),
+    State("store_previsao", "data"),
+    prevent_initial_call=True,
+)
+def checar_versao(n_intervals, versao_atual, previsao_atual):
+    # previsões chegam depois da carga (ajuste em segundo plano): têm o próprio aviso
+    versao = obter_snapshot()["versao"]
+    previsao = _previsao["impressao"]
+    return (
+        no_update if versao == versao_atual else versao,
+        no_update if previsao == previsao_atual else previsao,
+    )
+
+# sincronização sem mudança só renova verificado_em: a idade anda sem versão nova nem redesenho
+@app.callback(
+    Output("kpi_idade", "children"),
+    Input("interval_refresh", "n_intervals"),
+    Input("store_versao", "data"),
+)
+def atualizar_idade(n_intervals, versao):
+    snap = obter_snapshot()
+    return f"Dados {idade_snapshot(snap)} (v{snap['versao']})"
+
 # =========================
 # Callback Principal
 # =========================
@@ -587,17 +2420,11 @@ def toggle_sidebar(n, st):
     Output("kpi_sla", "children"),
     Output("kpi_media", "children"),
     Output("kpi_abertos", "children"),
-    Output("g_status", "figure"),
-    Output("g_impacto", "figure"),
-    Output("g_tecnico", "figure"),
-    Output("g_input1", "figure"),
-    Output("g_input2", "figure"),
-    Output("g_periodo", "figure"),
-    Output("g_solicitante", "figure"),
-    Output("tbl_ag", "rowData"),
-    Output("tbl_ag", "columnDefs"),
-    Output("tbl_ag", "className"),
-    Input("interval_refresh", "n_intervals"),
+    Output("store_figuras", "data"),
+    Output("store_grid", "data"),
+    Output("store_impressao", "data"),
+    Input("store_versao", "data"),
+    Input("store_previsao", "data"),
     Input("f_solicitante", "value"),
     Input("f_mes_emissao", "value"),
     Input("f_num_solicitacao", "value"),
@@ -606,164 +2433,340 @@ def toggle_sidebar(n, st):
     Input("f_input1", "value"),
     Input("f_input2", "value"),
     Input("f_atribuicao", "value"),
-    Input("theme_switch", "value"),
+    Input(FILTRO_TEXTO, "value"),
+    Input("backlog_dim", "value"),
+    State("store_impressao", "data"),
+    State("store_grid", "data"),
 )
-def update_all(n_intervals, f_solicitante, f_mes, f_numsol, f_status, f_tecnico, f_in1, f_in2, f_attr, is_dark_mode):
-    
-    # Configuração de Cores para Gráficos
-    template = "plotly_dark" if is_dark_mode else "plotly"
-    grid_class = "ag-theme-alpine-dark" if is_dark_mode else "ag-theme-alpine"
-    
-    # Se for dark, deixamos fundo transparente nos gráficos
-    bg_color = "rgba(0,0,0,0)" if is_dark_mode else "#ffffff"
-
-    dff = pd.read_sql(sql_query, conn)
-    dff = preparar_campos(dff)
-
-    # ... Filtros (código original) ...
-    if f_solicitante:
-        dff = dff[dff["nome_solicitante"].astype(str).isin([str(x) for x in f_solicitante])]
-    if f_mes:
-        dff = dff[dff["MES_EMISSAO"].astype(str).isin([str(x) for x in f_mes])]
-    if f_numsol:
-        dff = dff[dff["numSolFluig"].astype(str).isin([str(x) for x in f_numsol])]
-    if isinstance(f_status, str): f_status = [f_status]
-    if f_status:
-        f_status_norm = [str(x).strip().upper() for x in f_status]
-        dff = dff[dff["STATUS"].astype(str).str.strip().str.upper().isin(f_status_norm)]
-    if isinstance(f_tecnico, str): f_tecnico = [f_tecnico]
-    if f_tecnico:
-        f_tecnico_norm = [str(x).strip() for x in f_tecnico]
-        dff = dff[dff["nm_tecAtual"].astype(str).str.strip().isin(f_tecnico_norm)]
-    if f_in1:
-        dff = dff[dff["input1"].astype(str).isin([str(x) for x in f_in1])]
-    if f_in2:
-        dff = dff[dff["input2"].astype(str).isin([str(x) for x in f_in2])]
-    if f_attr:
-        dff = dff[dff["nm_atribuicao"].astype(str).isin([str(x) for x in f_attr])]
-
-    total = len(dff)
-    sla_proc_media = float(dff["SLA_PROCESSO"].dropna().mean()) if "SLA_PROCESSO" in dff.columns else 0.0
-    meses_distintos = int(dff["MES_EMISSAO"].dropna().nunique()) if "MES_EMISSAO" in dff.columns else 0
+def update_all(versao, previsao, f_solicitante, f_mes, f_numsol, f_status, f_tecnico, f_in1, f_in2, f_attr, f_busca, dim_backlog,
+               impressao_anterior, grid_anterior):
+    # tema (template/fundo) é aplicado no navegador; aqui os gráficos saem sem template
+    template = "plotly"
+
+    # nunca vai ao banco: o agendador mantém o snapshot em dia
+    snap = obter_snapshot()
+    filtros = dict(zip(FILTROS_SIDEBAR, [f_solicitante, f_mes, f_numsol, f_status, f_tecnico, f_in1, f_in2, f_attr]))
+    filtros[FILTRO_TEXTO] = f_busca
+    dim_backlog = dim_backlog if dim_backlog in BACKLOG_DIMS else "nm_tecAtual"
+
+    # previsão só entra na impressão quando aparece neste filtro: ajuste novo não redesenha os outros
+    faixa = faixa_previsao(filtros)
+    marca_previsao = faixa["impressao"] if faixa is not None else None
+
+    # versão nova que não mexeu nas linhas deste filtro (ou filtro equivalente): nada sai do servidor
+    atual = impressao_painel(snap, filtros, dim_backlog, marca_previsao)
+    if atual == impressao_anterior:
+        return (no_update,) * 7
+    dff = filtrar_snapshot(snap, filtros)
+
+    resumo = resumo_filtrado(snap, filtros, dff)
+
+    total = resumo["total"]
+    sla_proc_media = resumo["sla_media"]
+    meses_distintos = resumo["meses"]
     qtde_media = (total / meses_distintos) if meses_distintos > 0 else total
-    chamados_abertos = dff["END_DATE"].isna().sum()
+    chamados_abertos = resumo["abertos"]
 
     k1 = kpi_body("Qtde Solicitações", f"{total:,}".replace(",", "."), icon="bi bi-ticket-perforated")
-    k2 = kpi_body("SLA Processo (média - dias)", br_num(sla_proc_media, 0), icon="bi bi-clock-history")
+    k2 = kpi_body(
+        "SLA Processo (média - horas úteis)", br_num(resumo["sla_hu_media"], 1),
+        f"{br_num(sla_proc_media, 0)} dias corridos · p50 {br_num(resumo['sla_p50'], 1)} h · p90 {br_num(resumo['sla_p90'], 1)} h",
+        icon="bi bi-clock-history",
+    )
     k3 = kpi_body("Qtde média (por mês)", br_num(qtde_media, 0), f"Meses no filtro: {meses_distintos}", icon="bi bi-calendar3")
     k4 = kpi_body("Chamados em Aberto", f"{chamados_abertos:,}".replace(",", "."), icon="bi bi-exclamation-circle")
 
-    def update_fig(fig):
-        fig.update_layout(
-            paper_bgcolor=bg_color,
-            plot_bgcolor=bg_color,
-            margin=dict(l=10, r=10, t=30, b=10),
-            title=None
-        )
-        return fig
+    # figuras: mesma versão + mesmos filtros (outra tela/aba) => sai do cache, sem montar nada
+    chave = chave_figuras(snap["versao"], filtros, template, dim_backlog, marca_previsao)
+    figuras = figuras_em_cache(chave)
+    if figuras is None:
+        figuras = montar_figuras(resumo, dff, template, dim_backlog, faixa)
+        guardar_figuras(chave, figuras)
 
-    st = count_df(dff, "STATUS", "STATUS").sort_values("QTD", ascending=False)
+    # o grid busca as linhas sozinho (linhas_grid); aqui só avisamos que versão/filtros mudaram.
+    # mesmos filtros e versão nova => vão junto só as linhas alteradas, trocadas no lugar
+    linhas = None
+    if grid_anterior and grid_anterior.get("filtros") == filtros:
+        linhas = delta_grid(snap, filtros, grid_anterior.get("versao"))
+    grid_estado = {"versao": snap["versao"], "filtros": filtros, "linhas": linhas}
 
-    fig_status = px.bar(
-        st,
-        x="STATUS",
-        y="QTD",
-        text="QTD",             # ✅ mostra o valor
-        template=template
+    return (
+        k1, k2, k3, k4,
+        figuras,
+        grid_estado,
+        atual,
     )
 
-    # ✅ formata/posiciona o texto em cima das barras e melhora leitura
-    fig_status.update_traces(
-        texttemplate="%{text}",  # pode trocar por "%{text:,}" se quiser milhar
-        textposition="outside",
-        cliponaxis=False
+# =========================
+# Backlog: situação numa data (mesmos filtros do painel)
+# =========================
+@app.callback(
+    Output("backlog_situacao", "children"),
+    Input("backlog_data", "date"),
+    Input("backlog_dim", "value"),
+    Input("store_grid", "data"),
+)
+def situacao_backlog(data, dim, grid_estado):
+    if not data or not grid_estado or dim not in BACKLOG_DIMS:
+        return no_update
+    dff = filtrar_snapshot(obter_snapshot(), grid_estado["filtros"])
+    sit = backlog_em(dff, dim, data)
+    linhas = [html.Tr([html.Td(nome), html.Td(f"{qtd:,}".replace(",", "."), className="text-end")])
+              for nome, qtd in sit.head(15).itertuples(index=False)]
+    total = int(sit["ABERTOS"].sum())
+    return dbc.Table(
+        [
+            html.Thead(html.Tr([html.Th(BACKLOG_DIMS[dim]), html.Th("Abertos", className="text-end")])),
+            html.Tbody(linhas + [html.Tr([html.Th("TOTAL"), html.Th(f"{total:,}".replace(",", "."), className="text-end")])]),
+        ],
+        size="sm", striped=True, className="mb-0 small",
     )
 
-    # ✅ dá folga no eixo Y para não cortar o texto no topo
-    fig_status.update_layout(
-        uniformtext_minsize=10,
-        uniformtext_mode="hide",
-        yaxis=dict(rangemode="tozero"),
-        margin=dict(l=10, r=10, t=30, b=10),
+# =========================
+# SLA: p50/p90/p95 por técnico/grupo/mês (mesmos filtros do painel)
+# =========================
+@app.callback(
+    Output("sla_percentis", "children"),
+    Input("sla_pct_dim", "value"),
+    Input("store_grid", "data"),
+)
+def tabela_percentis(dim, grid_estado):
+    if not grid_estado or dim not in SLA_PCT_DIMS:
+        return no_update
+    snap = obter_snapshot()
+    filtros = grid_estado["filtros"]
+    celulas = fatiar_cubo(snap["cubo"], filtros)
+    dff = filtrar_snapshot(snap, filtros) if celulas is None else None
+    pct = percentis_sla(snap, celulas, dff, dim)
+    if dim == "MES_EMISSAO":
+        pct = pct.sort_values(SLA_PCT_DIMS[dim], ascending=False, kind="stable")
+    else:
+        pct = pct.sort_values("QTD", ascending=False, kind="stable")
+    colunas = [f"P{int(q * 100)}" for q in SLA_PERCENTIS]
+    linhas = [
+        html.Tr(
+            [html.Td(nome), html.Td(f"{qtd:,}".replace(",", "."), className="text-end")]
+            + [html.Td(br_num(v, 1), className="text-end") for v in valores]
+        )
+        for nome, qtd, *valores in pct.head(30).itertuples(index=False)
+    ]
+    return dbc.Table(
+        [
+            html.Thead(html.Tr(
+                [html.Th(SLA_PCT_DIMS[dim]), html.Th("Finalizados", className="text-end")]
+                + [html.Th(c, className="text-end") for c in colunas]
+            )),
+            html.Tbody(linhas),
+        ],
+        size="sm", striped=True, className="mb-0 small",
     )
 
-    update_fig(fig_status)
-    
-
-    imp = count_df(dff, "lb_impacto", "Impacto")
-    fig_impacto = px.pie(imp, names="Impacto", values="QTD", hole=0.6, template=template)
-    update_fig(fig_impacto)
+# =========================
+# Prováveis duplicados: incidentes (MinHash/LSH) dentro dos filtros do painel
+# =========================
+@app.callback(
+    Output("duplicados", "children"),
+    Input("store_grid", "data"),
+)
+def tabela_duplicados(grid_estado):
+    if not grid_estado:
+        return no_update
+    inc = incidentes(filtrar_snapshot(obter_snapshot(), grid_estado["filtros"])).head(DUP_TOP)
+    if inc.empty:
+        return html.Div("Nenhum grupo de chamados parecidos nos filtros atuais.", className="text-muted small")
+    # trecho da descrição do 1º chamado de cada grupo: 1 leitura p/ os que não estão no LRU
+    detalhes = detalhes_chamados(inc["INCIDENTE"].astype(np.int64))
+    linhas = []
+    for r in inc.itertuples(index=False):
+        desc = str(detalhes[str(int(r.INCIDENTE))].get("descSolicitante") or "").strip()
+        linhas.append(html.Tr([
+            html.Td(int(r.INCIDENTE)),
+            html.Td(r.CHAMADOS, className="text-end"),
+            html.Td(r.ABERTOS, className="text-end"),
+            html.Td(f"{r.PRIMEIRO:%d/%m %H:%M} – {r.ULTIMO:%d/%m/%Y %H:%M}"),
+            html.Td(str(r.GRUPO) if pd.notna(r.GRUPO) else "N/I"),
+            html.Td(desc[:140] + ("…" if len(desc) > 140 else ""), className="text-muted"),
+        ]))
+    return dbc.Table(
+        [
+            html.Thead(html.Tr([
+                html.Th("Incidente"), html.Th("Chamados", className="text-end"), html.Th("Abertos", className="text-end"),
+                html.Th("Período"), html.Th("Grupo"), html.Th("Descrição"),
+            ])),
+            html.Tbody(linhas),
+        ],
+        size="sm", striped=True, className="mb-0 small",
+    )
 
-    tec_all = count_df(dff, "nm_tecAtual", "Técnico").sort_values("QTD", ascending=False)
-    top15 = tec_all.head(15).copy()
-    outros_qtd = tec_all["QTD"].iloc[15:].sum()
-    if outros_qtd > 0:
-        top15 = pd.concat([top15, pd.DataFrame([{"Técnico": "OUTROS", "QTD": outros_qtd}])], ignore_index=True)
+# =========================
+# Grid: blocos de linhas sob demanda
+# =========================
+@app.callback(
+    Output("tbl_ag", "getRowsResponse"),
+    Input("tbl_ag", "getRowsRequest"),
+    [State(fid, "value") for fid in IDS_FILTROS],
+    prevent_initial_call=True,
+)
+def linhas_grid(req, *valores):
+    if not req:
+        return no_update
+    dff = filtrar_snapshot(obter_snapshot(), dict(zip(IDS_FILTROS, valores)))
+    dff = filtrar_grid(dff, req.get("filterModel"))
+    dff = ordenar_grid(dff, req.get("sortModel"))
 
-    fig_tecnico = px.bar(top15, x="QTD", y="Técnico", orientation="h", text="QTD", template=template)
-    fig_tecnico.update_layout(yaxis={"categoryorder": "total ascending"})
-    update_fig(fig_tecnico)
+    bloco = dff.iloc[req.get("startRow", 0):req.get("endRow", GRID_BLOCO)]
+    return {"rowData": bloco[cols0].to_dict("records"), "rowCount": len(dff)}
 
-    in1 = count_df(dff, "input1", "Grupo").sort_values("QTD", ascending=False).head(15)
-    fig_in1 = px.scatter(in1, x="Grupo", y="QTD", size="QTD", color="Grupo", size_max=30, template=template)
-    fig_in1.update_layout(showlegend=False)
-    update_fig(fig_in1)
+# =========================
+# Detalhe do chamado: textos longos lidos só quando a linha é aberta
+# =========================
+ROTULOS_DETALHE = {
+    "descSolicitante": "Descrição do solicitante",
+    "orientacao": "Orientação",
+    "solucao": "Solução",
+    "DSL_OBS_TAR": "Observação da última tarefa",
+}
 
-    in2 = count_df(dff, "input2", "Subgrupo").sort_values("QTD", ascending=False).head(20)
-    fig_in2 = px.scatter(in2, x="Subgrupo", y="QTD", size="QTD", color="Subgrupo", size_max=30, template=template)
-    fig_in2.update_layout(showlegend=False)
-    update_fig(fig_in2)
+@app.callback(
+    Output("detalhe_painel", "is_open"),
+    Output("detalhe_painel", "title"),
+    Output("detalhe_corpo", "children"),
+    Input("tbl_ag", "cellClicked"),
+    prevent_initial_call=True,
+)
+def abrir_detalhe(celula):
+    documentid = (celula or {}).get("rowId")
+    if not documentid:
+        return no_update, no_update, no_update
+    det = detalhe_chamado(documentid)
+    if not det:
+        return True, "Chamado", html.Div("Chamado não encontrado no banco.", className="text-muted")
+    titulo = f"Solicitação {det.get('numSolFluig') or '—'} · processo {det.get('NUM_PROCES') or '—'}"
+    corpo = []
+    for col, rotulo in ROTULOS_DETALHE.items():
+        valor = det.get(col)
+        texto = str(valor).strip() if valor is not None and pd.notna(valor) else ""
+        corpo += [
+            html.H6(rotulo, className="mt-3 mb-1"),
+            html.Div(texto or "—", className="small" if texto else "small text-muted", style={"whiteSpace": "pre-wrap"}),
+        ]
+    return True, titulo, corpo
 
-    sol = (
-        dff["nome_solicitante"].fillna("N/I").astype(str).str.strip().replace({"": "N/I"})
-        .value_counts().reset_index()
-    )
-    sol.columns = ["Solicitante", "QTD"]
-    top15_sol = sol.sort_values("QTD", ascending=False).head(15)
-    fig_solicitante = px.bar(top15_sol, x="Solicitante", y="QTD", text="QTD", template=template)
-    fig_solicitante.update_layout(xaxis_tickangle=-45)
-    update_fig(fig_solicitante)
-
-    tmp = dff.dropna(subset=["dt_emissao"]).copy()
-    tmp["PERIODO"] = tmp["dt_emissao"].dt.to_period("M").dt.to_timestamp()
-    df_periodo = tmp.groupby("PERIODO").size().reset_index(name="QTD").sort_values("PERIODO")
-    fig_periodo = px.area(df_periodo, x="PERIODO", y="QTD", template=template)
-    fig_periodo.update_traces(mode="lines+markers", line_shape="spline", marker=dict(size=8), line=dict(width=2))
-    fig_periodo.update_layout(xaxis_title="Período", yaxis_title="Quantidade", hovermode="x unified")
-    update_fig(fig_periodo)
-
-    cols = [c for c in preferidas if c in dff.columns]
-    cols += [c for c in dff.columns if c not in cols]
-    view = dff[cols].copy()
-
-    rowData = view.to_dict("records")
-    columnDefs = [{"headerName": c, "field": c, "filter": True, "sortable": True, "resizable": True} for c in view.columns]
+# =========================
+# Opções dos filtros (com contagem) só quando chega versão nova
+# =========================
+@app.callback(
+    [Output(fid, "options") for fid in FILTROS_COM_OPCOES],
+    Output("store_opcoes_versao", "data"),
+    Input("store_versao", "data"),
+    State("store_opcoes_versao", "data"),
+    prevent_initial_call=True,
+)
+def atualizar_opcoes(versao, versao_opcoes):
+    snap = obter_snapshot()
+    if snap["versao"] == versao_opcoes:
+        return [no_update] * len(FILTROS_COM_OPCOES) + [no_update]
+    opcoes = opcoes_filtros(snap["indices"])
+    return [opcoes[fid] for fid in FILTROS_COM_OPCOES] + [snap["versao"]]
 
-    return (
-        k1, k2, k3, k4,
-        fig_status, fig_impacto, fig_tecnico, fig_in1, fig_in2, fig_periodo, fig_solicitante,
-        rowData, columnDefs, grid_class
-    )
+# =========================
+# Nº Solicitação: opções buscadas no servidor conforme digita (só os N primeiros)
+# =========================
+@app.callback(
+    Output("f_num_solicitacao", "options"),
+    Input("f_num_solicitacao", "search_value"),
+    State("f_num_solicitacao", "value"),
+    prevent_initial_call=True,
+)
+def opcoes_numsol(busca, selecionados):
+    # sempre lê o snapshot atual: número novo aparece assim que a versão chega
+    achados = buscar_prefixo(obter_snapshot()["prefixos"], busca)
+    # os já selecionados continuam nas opções, senão o dropdown os descarta
+    selecionados = [str(v) for v in (selecionados or [])]
+    return [{"label": v, "value": v} for v in dict.fromkeys(selecionados + achados)]
+
+# filtro mudou (ou versão sem diferença aplicável) => descarta os blocos em cache e o grid pede de novo;
+# versão nova com só algumas linhas alteradas => troca os dados dos nós carregados (rolagem/seleção ficam)
+app.clientside_callback(
+    """
+function(estado) {
+    dash_ag_grid.getApiAsync("tbl_ag").then((api) => {
+        const linhas = estado && estado.linhas;
+        if (!Array.isArray(linhas)) {
+            api.purgeInfiniteCache();
+            return;
+        }
+        if (!linhas.length) {
+            return;
+        }
+        // com ordenação/filtro de coluna no grid, valor alterado pode mudar a posição da linha
+        if (api.getColumnState().some((c) => c.sort) || api.isAnyFilterPresent()) {
+            api.purgeInfiniteCache();
+            return;
+        }
+        linhas.forEach((row) => {
+            const node = api.getRowNode(String(row.documentid));
+            if (node) {
+                node.setData(row);
+            }
+        });
+    });
+}
+    """,
+    Input("store_grid", "data"),
+    prevent_initial_call=True,
+)
 
 # =========================
-# Export XLSX
+# Export (XLSX/CSV/Parquet) em segundo plano, direto do snapshot
 # =========================
 @app.callback(
-    Output("download_xlsx", "data"),
+    Output("export_job", "data"),
+    Output("export_poll", "disabled"),
+    Output("btn_export_xlsx", "disabled"),
     Input("btn_export_xlsx", "n_clicks"),
-    State("tbl_ag", "rowData"),
+    State("export_formato", "value"),
+    State("tbl_ag", "filterModel"),
+    [State(fid, "value") for fid in IDS_FILTROS],
     prevent_initial_call=True,
 )
-def exportar_xlsx(n_clicks, table_data):
-    if not table_data:
-        return None
-    df_export = pd.DataFrame(table_data)
-    return dcc.send_data_frame(
-        df_export.to_excel,
-        "suporte_tecnico.xlsx",
-        index=False,
-        sheet_name="Dados"
-    )
-    
+def exportar_xlsx(n_clicks, formato, filter_model, *valores):
+    # o grid não tem todas as linhas no navegador: o servidor gera o arquivo com os filtros atuais
+    base, pos = linhas_para_exportar(obter_snapshot(), dict(zip(IDS_FILTROS, valores)), filter_model)
+    job_id = iniciar_export(base, pos, formato or "xlsx")
+    return job_id, False, True
+
+@app.callback(
+    Output("export_status", "children"),
+    Output("export_poll", "disabled", allow_duplicate=True),
+    Output("btn_export_xlsx", "disabled", allow_duplicate=True),
+    Input("export_poll", "n_intervals"),
+    State("export_job", "data"),
+    prevent_initial_call=True,
+)
+def acompanhar_export(n, job_id):
+    job = _exports.get(job_id)
+    if job is None:
+        return "", True, False
+    if job["erro"]:
+        return html.Span(f"Falha no export: {job['erro']}", className="text-danger"), True, False
+    if not job["pronto"]:
+        return dbc.Progress(value=int(job["progresso"] * 100), label=f"{job['progresso']:.0%}",
+                            style={"width": "160px"}), False, True
+    return html.A(f"Baixar {job['nome']}", href=f"/exportar/{job_id}"), True, False
+
+@app.server.route("/exportar/<job_id>")
+def baixar_export(job_id):
+    job = _exports.get(job_id)
+    if job is None or not job["pronto"]:
+        flask.abort(404)
+    return flask.send_file(job["arquivo"], as_attachment=True, download_name=job["nome"])
+
+# contadores do cache de figuras (acompanhar taxa de acerto com várias telas abertas)
+@app.server.route("/cache/figuras")
+def status_cache_figuras():
+    with _figuras_lock:
+        return flask.jsonify(dict(_figuras_stats, entradas=len(_figuras), limite_bytes=FIG_CACHE_MAX_BYTES))
+
 if __name__ == "__main__":
     app.run(debug=True, port=8057)
\ No newline at end of file
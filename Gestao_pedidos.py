@@ -2,18 +2,24 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 
-from dash import Dash, html, dcc, dash_table
+from dash import Dash, html, dcc, dash_table, no_update
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import plotly.express as px
-import pyodbc
+
+from agendador import Agendador, DadosVersionados, impressao
+from conexao import PoolConexoes, where_parametrizado
+from figuras import fig_area, fig_barras
 
 # =========================================================
 # 0) CONFIG / CONSTANTES
 # =========================================================
 BOOTSTRAP_ICONS = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.css"
 APP_TITLE = "Aprovações - Compras (Protheus)"
-REFRESH_MS = 2 * 60 * 1000  # 2 min
+REFRESH_S = 2 * 60          # agendador no servidor: 1 consulta a cada 2 min, para todas as abas
+REFRESH_JITTER_S = 15
+VERSAO_CHECK_MS = 15 * 1000  # as abas só conferem a versão dos dados
+TEMPLATE_FIGURAS = "plotly"  # mesmo template padrão que o px usava
 
 PAGE_STYLE = {"padding": "12px", "backgroundColor": "#a5aeb8", "minHeight": "100vh"}
 
@@ -55,8 +61,9 @@ CONN_STR = (
     "UID=consulta;"
     "PWD=G@l@t@s2:20;"
 )
+db = PoolConexoes(CONN_STR, tamanho=4)
 # OBS: removi colunas repetidas (AL_NIVEL/AL_APROV duplicadas) e aspas desnecessárias
-sql_query = """
+SQL_PEDIDOS = """
 SELECT DISTINCT
     SAL.AL_COD AS COD_GRUPO_APROVADOR,
     C7.C7_NUM AS NUM_PEDIDO,
@@ -106,9 +113,23 @@ LEFT JOIN SYS_USR SU
 WHERE
     USR.D_E_L_E_T_ = ''
     AND SAL.AL_MSBLQL = '2'
-    AND C7.C7_EMISSAO >= DATEADD(MONTH, -4, GETDATE())
+    AND C7.C7_EMISSAO >= DATEADD(MONTH, -4, GETDATE()){filtro_where}
 ORDER BY SAL.AL_NIVEL ASC;
 """
+sql_query = SQL_PEDIDOS.format(filtro_where="")
+
+# pushdown: com filtro ativo, o WHERE vai para o banco (valores sempre como parâmetro)
+PUSHDOWN_SQL = False
+SQL_FILTRO_EXPR = {
+    "f_fornecedor": "LTRIM(RTRIM(FORN.A2_NOME))",
+    "f_cc": "LTRIM(RTRIM(C7.C7_CC))",
+    "f_descr_cc": "LTRIM(RTRIM(CC.CTT_DESC01))",
+    "f_pedido": "LTRIM(RTRIM(C7.C7_NUM))",
+    "f_mes": "LEFT(C7.C7_EMISSAO, 4) + '/' + SUBSTRING(C7.C7_EMISSAO, 5, 2)",
+    "f_status": "CASE WHEN NULLIF(LTRIM(RTRIM(CR.CR_DATALIB)), '') IS NOT NULL THEN 'APROVADO' ELSE 'PENDENTE' END",
+    "f_requisitante": "LTRIM(RTRIM(SU.USR_NOME))",
+    "f_aprovador": "LTRIM(RTRIM(USR.AK_NOME))",
+}
 
 # =========================================================
 # 2) HELPERS
@@ -167,9 +188,12 @@ def card_com_header(titulo, graph_id):
 # =========================================================
 # 3) DATA LAYER
 # =========================================================
-def get_data() -> pd.DataFrame:
-    with pyodbc.connect(CONN_STR) as conn:
-        df = pd.read_sql(sql_query, conn)
+def get_data(filtros: dict = None) -> pd.DataFrame:
+    if PUSHDOWN_SQL and filtros:
+        where, params = where_parametrizado(SQL_FILTRO_EXPR, filtros)
+        if params:
+            return db.ler_sql(SQL_PEDIDOS.format(filtro_where=where), params=params, preparar=True)
+    df = db.ler_sql(sql_query)
     return df
 
 def preparar_campos(dff: pd.DataFrame) -> pd.DataFrame:
@@ -327,8 +351,7 @@ def build_figures(dff: pd.DataFrame):
         .rename_axis("STATUS")
         .reset_index(name="QTD")
     )
-    fig_status = px.bar(st, x="STATUS", y="QTD")
-    fig_status.update_layout(title=None)
+    fig_status = fig_barras(st["STATUS"], st["QTD"], "STATUS", "QTD", template=TEMPLATE_FIGURAS)
 
     # Por nível
     if "NIVEL" in dff.columns:
@@ -342,11 +365,9 @@ def build_figures(dff: pd.DataFrame):
             .reset_index(name="QTD")
             .sort_values("NIVEL")
         )
-        fig_nivel = px.bar(nv, x="NIVEL", y="QTD")
-        fig_nivel.update_layout(title=None)
+        fig_nivel = fig_barras(nv["NIVEL"], nv["QTD"], "NIVEL", "QTD", template=TEMPLATE_FIGURAS)
     else:
-        fig_nivel = px.bar(pd.DataFrame({"NIVEL": ["N/I"], "QTD": [1]}), x="NIVEL", y="QTD")
-        fig_nivel.update_layout(title=None)
+        fig_nivel = fig_barras(["N/I"], [1], "NIVEL", "QTD", template=TEMPLATE_FIGURAS)
 
     # Top aprovadores (pendentes)
     pend = dff[dff["STATUS_APROVACAO"].eq("PENDENTE")] if "STATUS_APROVACAO" in dff.columns else dff.iloc[0:0]
@@ -361,11 +382,12 @@ def build_figures(dff: pd.DataFrame):
             .reset_index(name="QTD")
             .head(15)
         )
-        fig_aprov = px.bar(ap, x="QTD", y="APROVADOR", orientation="h", text="QTD")
-        fig_aprov.update_layout(title=None, yaxis={"categoryorder": "total ascending"}, margin=dict(l=10, r=10, t=10, b=10))
+        fig_aprov = fig_barras(
+            ap["APROVADOR"], ap["QTD"], "APROVADOR", "QTD", horizontal=True, texto=True, template=TEMPLATE_FIGURAS,
+            layout={"yaxis": {"categoryorder": "total ascending"}, "margin": dict(l=10, r=10, t=10, b=10)},
+        )
     else:
-        fig_aprov = px.bar(pd.DataFrame({"APROVADOR": ["N/I"], "QTD": [0]}), x="QTD", y="APROVADOR", orientation="h")
-        fig_aprov.update_layout(title=None)
+        fig_aprov = fig_barras(["N/I"], [0], "APROVADOR", "QTD", horizontal=True, template=TEMPLATE_FIGURAS)
 
     # Período
     if "DT_EMISSAO" in dff.columns:
@@ -375,9 +397,11 @@ def build_figures(dff: pd.DataFrame):
     else:
         df_periodo = pd.DataFrame({"PERIODO": [pd.Timestamp.today().normalize()], "QTD_PEDIDOS": [0]})
 
-    fig_periodo = px.area(df_periodo, x="PERIODO", y="QTD_PEDIDOS")
-    fig_periodo.update_traces(mode="lines+markers", line_shape="spline", marker=dict(size=8), line=dict(width=2))
-    fig_periodo.update_layout(title=None, xaxis_title="Período", yaxis_title="Pedidos", hovermode="x unified")
+    fig_periodo = fig_area(
+        df_periodo["PERIODO"], df_periodo["QTD_PEDIDOS"], "PERIODO", "QTD_PEDIDOS", template=TEMPLATE_FIGURAS,
+        trace={"mode": "lines+markers", "line": {"shape": "spline", "width": 2}, "marker": {"size": 8}},
+        layout={"xaxis": {"title": {"text": "Período"}}, "yaxis": {"title": {"text": "Pedidos"}}, "hovermode": "x unified"},
+    )
 
     fig_timeline = build_timeline_figure(dff)
     
@@ -386,7 +410,12 @@ def build_figures(dff: pd.DataFrame):
 # =========================================================
 # 5) OPTIONS (boot)
 # =========================================================
-df0 = preparar_campos(get_data())
+# fonte única: o agendador recarrega em segundo plano e a versão só sobe quando os dados mudam
+pedidos = DadosVersionados(lambda: preparar_campos(get_data()))
+pedidos.atualizar()
+agendador = Agendador("pedidos", pedidos.atualizar, REFRESH_S, REFRESH_JITTER_S).iniciar()
+
+df0 = pedidos.dados
 
 options_fornecedor = opts_from_series(df0.get("NOME_FORNECEDOR"))
 options_cc = opts_from_series(df0.get("CENTRO_CUSTO"))
@@ -536,7 +565,9 @@ app.layout = dbc.Container(
     children=[
         dcc.Store(id="sidebar_state", data={"open": True}),
         dcc.Download(id="download_xlsx"),
-        dcc.Interval(id="interval_refresh", interval=REFRESH_MS, n_intervals=0),
+        dcc.Interval(id="interval_refresh", interval=VERSAO_CHECK_MS, n_intervals=0),
+        dcc.Store(id="store_versao", data=pedidos.versao),
+        dcc.Store(id="store_impressao"),
         dbc.Row(
             [
                 dbc.Col(sidebar, id="col_sidebar", width=2),
@@ -566,6 +597,16 @@ def toggle_sidebar(n, st):
     col_main = 9 if is_open else 12
     return is_open, col_sidebar, col_main, {"open": is_open}
 
+# o intervalo só confere a versão; update_all roda quando ela muda (ou quando um filtro muda)
+@app.callback(
+    Output("store_versao", "data"),
+    Input("interval_refresh", "n_intervals"),
+    State("store_versao", "data"),
+    prevent_initial_call=True,
+)
+def checar_versao(n_intervals, versao_atual):
+    return no_update if pedidos.versao == versao_atual else pedidos.versao
+
 @app.callback(
     Output("kpi_total_pedidos", "children"),
     Output("kpi_pendentes", "children"),
@@ -578,7 +619,8 @@ def toggle_sidebar(n, st):
     Output("g_timeline", "figure"),
     Output("tbl", "data"),
     Output("tbl", "columns"),
-    Input("interval_refresh", "n_intervals"),
+    Output("store_impressao", "data"),
+    Input("store_versao", "data"),
     Input("f_fornecedor", "value"),
     Input("f_cc", "value"),
     Input("f_descr_cc", "value"),
@@ -587,9 +629,17 @@ def toggle_sidebar(n, st):
     Input("f_status", "value"),
     Input("f_requisitante", "value"),
     Input("f_aprovador", "value"),
+    State("store_impressao", "data"),
 )
-def update_all(n_intervals, f_fornecedor, f_cc, f_descr_cc, f_pedido, f_mes, f_status, f_requisitante, f_aprovador):
-    dff = preparar_campos(get_data())
+def update_all(versao, f_fornecedor, f_cc, f_descr_cc, f_pedido, f_mes, f_status, f_requisitante, f_aprovador, impressao_anterior):
+    filtros = {
+        "f_fornecedor": f_fornecedor, "f_cc": f_cc, "f_descr_cc": f_descr_cc, "f_pedido": f_pedido,
+        "f_mes": f_mes, "f_status": f_status, "f_requisitante": f_requisitante, "f_aprovador": f_aprovador,
+    }
+    if PUSHDOWN_SQL and any(filtros.values()):
+        dff = preparar_campos(get_data(filtros))
+    else:
+        dff = pedidos.dados   # filtros abaixo geram cópias; o df compartilhado não é alterado
 
     # filtros
     if f_fornecedor:
@@ -611,6 +661,11 @@ def update_all(n_intervals, f_fornecedor, f_cc, f_descr_cc, f_pedido, f_mes, f_s
     if f_aprovador:
         dff = dff[dff["NOME_APROVADOR"].astype(str).isin([str(x) for x in f_aprovador])]    
 
+    # as saídas só dependem das linhas filtradas: mesmas linhas do último envio => nada a mandar
+    atual = impressao(dff)
+    if atual == impressao_anterior:
+        return (no_update,) * 12
+
     # KPIs
     total_pedidos = int(dff["NUM_PEDIDO"].nunique()) if "NUM_PEDIDO" in dff.columns else 0
     pendentes = int(dff["STATUS_APROVACAO"].eq("PENDENTE").sum()) if "STATUS_APROVACAO" in dff.columns else 0
@@ -639,7 +694,7 @@ def update_all(n_intervals, f_fornecedor, f_cc, f_descr_cc, f_pedido, f_mes, f_s
     data = view.to_dict("records")
     columns = [{"name": c, "id": c} for c in view.columns]
 
-    return k1, k2, k3, k4, fig_status, fig_nivel, fig_aprov, fig_periodo, fig_timeline, data, columns
+    return k1, k2, k3, k4, fig_status, fig_nivel, fig_aprov, fig_periodo, fig_timeline, data, columns, atual
 
 
 @app.callback(
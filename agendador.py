@@ -0,0 +1,113 @@
+import hashlib
+import random
+import threading
+import time
+import traceback
+
+import pandas as pd
+
+# =========================================================
+# ATUALIZAÇÃO EM SEGUNDO PLANO (1 thread por fonte de dados)
+# =========================================================
+# - o banco é consultado pelo servidor no ritmo da fonte, não no ritmo das abas abertas
+# - jitter: painéis que sobem juntos não batem no banco no mesmo segundo
+# - single-flight: se uma atualização ainda está rodando, a próxima não começa
+# - as abas só conferem a versão (callback barato) e redesenham quando ela muda
+
+
+class Agendador:
+    def __init__(self, nome: str, tarefa, periodo_s: float, jitter_s: float = 0.0):
+        self.nome = nome
+        self.tarefa = tarefa
+        self.periodo_s = periodo_s
+        self.jitter_s = jitter_s
+        self.status = {"execucoes": 0, "falhas": 0, "ultimo_erro": None, "ultima_execucao": None, "duracao_s": None}
+
+        self._rodando = threading.Lock()
+        self._parar = threading.Event()
+        self._agora = threading.Event()
+        self._thread = None
+
+    def executar(self) -> bool:
+        """Roda a tarefa já, na thread atual. False = outra execução em andamento (não enfileira)."""
+        if not self._rodando.acquire(blocking=False):
+            return False
+        inicio = time.monotonic()
+        try:
+            self.tarefa()
+            self.status["execucoes"] += 1
+        except Exception as exc:
+            # falha de banco não derruba a thread: o painel segue com a última versão boa
+            self.status["falhas"] += 1
+            self.status["ultimo_erro"] = f"{type(exc).__name__}: {exc}"
+            traceback.print_exc()
+        finally:
+            self.status["ultima_execucao"] = pd.Timestamp.now()
+            self.status["duracao_s"] = round(time.monotonic() - inicio, 2)
+            self._rodando.release()
+        return True
+
+    def pedir_execucao(self):
+        # acorda a thread antes do próximo período (ex.: botão "atualizar agora")
+        self._agora.set()
+
+    def _espera(self) -> float:
+        return max(1.0, self.periodo_s + random.uniform(-self.jitter_s, self.jitter_s))
+
+    def _laco(self, imediato: bool):
+        if not imediato:
+            self._agora.wait(self._espera())
+        while not self._parar.is_set():
+            self._agora.clear()
+            self.executar()
+            self._agora.wait(self._espera())
+
+    def iniciar(self, imediato: bool = False):
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._laco, args=(imediato,), daemon=True, name=f"agendador_{self.nome}")
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        self._agora.set()
+
+
+def impressao(*partes) -> str:
+    """Impressão digital curta do conteúdo (DataFrames pelo hash das linhas, o resto pelo repr).
+
+    Estável entre processos (não usa hash() do Python): o navegador guarda o valor e
+    qualquer worker consegue comparar com o que ia mandar de novo.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for parte in partes:
+        if isinstance(parte, pd.DataFrame):
+            h.update(repr(list(parte.columns)).encode())
+            h.update(pd.util.hash_pandas_object(parte, index=False).to_numpy().tobytes())
+        else:
+            h.update(repr(parte).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+class DadosVersionados:
+    """Último DataFrame de `carregar()` + versão, que só sobe quando o conteúdo muda."""
+
+    def __init__(self, carregar):
+        self.carregar = carregar
+        self.versao = 0
+        self.dados = None
+        self.atualizado_em = None
+        self._digest = None
+
+    def atualizar(self) -> bool:
+        df = self.carregar()
+        digest = int(pd.util.hash_pandas_object(df, index=False).sum()) ^ hash(tuple(df.columns))
+        self.atualizado_em = pd.Timestamp.now()
+        if digest == self._digest:
+            return False
+        # troca a referência inteira: quem já leu `dados` continua com o df antigo, intacto
+        self.dados, self._digest = df, digest
+        self.versao += 1
+        return True
@@ -0,0 +1,110 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import minimize
+
+# =========================================================
+# CLASSIFICADOR LINEAR SOBRE TF-IDF (só numpy/scipy)
+# =========================================================
+# - documento = (ids dos termos, frequências) -> linha de uma matriz esparsa
+# - TF-IDF com tf sublinear (1 + log) e linha normalizada (L2)
+# - regressão logística multinomial (softmax) com L2, ajustada por L-BFGS;
+#   a probabilidade da classe escolhida é a "confiança" da sugestão
+# - features = só os termos do próprio treino (df mínimo + teto): os pesos são densos
+#   (termos x classes) e o vocabulário compartilhado do painel só cresce
+# - re-treino parte dos pesos anteriores (warm start): poucas iterações quando pouco mudou
+
+
+def matriz_termos(por_doc: list, n_termos: int) -> sp.csr_matrix:
+    """[(ids, freq), ...] -> matriz esparsa documentos x termos com as contagens."""
+    tam = np.fromiter((len(t) for t, _ in por_doc), dtype=np.int64, count=len(por_doc))
+    ptr = np.concatenate([[0], np.cumsum(tam)])
+    ids = np.concatenate([t for t, _ in por_doc]) if len(por_doc) else np.empty(0, np.int64)
+    freq = np.concatenate([f for _, f in por_doc]) if len(por_doc) else np.empty(0)
+    largura = max(n_termos, int(ids.max()) + 1 if len(ids) else 0)
+    m = sp.csr_matrix((freq.astype(np.float64), ids, ptr), shape=(len(por_doc), largura))
+    # termo que surgiu depois do treino não tem peso: fica de fora
+    return m[:, :n_termos] if largura > n_termos else m
+
+
+def selecionar_termos(contagens: sp.csr_matrix, min_df: int, max_termos: int) -> np.ndarray:
+    """Ids (colunas) dos termos que viram features: em >= min_df documentos, os max_termos mais frequentes."""
+    df = np.bincount(contagens.indices, minlength=contagens.shape[1])
+    ok = np.flatnonzero(df >= min_df)
+    if len(ok) > max_termos:
+        ok = ok[np.argsort(-df[ok], kind="stable")[:max_termos]]
+    return np.sort(ok)
+
+
+def ajustar_idf(contagens: sp.csr_matrix) -> np.ndarray:
+    n = contagens.shape[0]
+    df = np.bincount(contagens.indices, minlength=contagens.shape[1])
+    return np.log((1 + n) / (1 + df)) + 1
+
+
+def tfidf(contagens: sp.csr_matrix, idf: np.ndarray) -> sp.csr_matrix:
+    x = contagens.copy()
+    x.data = 1 + np.log(x.data)
+    x = x @ sp.diags(idf[:x.shape[1]])
+    norma = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+    norma[norma == 0] = 1
+    return sp.csr_matrix(sp.diags(1 / norma) @ x)
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+def treinar(x: sp.csr_matrix, y: np.ndarray, n_classes: int, l2=1e-4, pesos_iniciais=None, max_iter=150):
+    """Pesos (termos x classes) e vieses da regressão softmax; y = índice da classe de cada linha."""
+    n, d = x.shape
+    linhas = np.arange(n)
+    xt = x.T.tocsr()
+
+    def custo(theta):
+        w = theta[:d * n_classes].reshape(d, n_classes)
+        b = theta[d * n_classes:]
+        p = _softmax(np.asarray(x @ w) + b)
+        perda = -np.log(np.maximum(p[linhas, y], 1e-12)).mean() + 0.5 * l2 * np.sum(w * w)
+        p[linhas, y] -= 1
+        p /= n
+        grad_w = np.asarray(xt @ p) + l2 * w
+        return perda, np.concatenate([grad_w.ravel(), p.sum(axis=0)])
+
+    theta0 = np.zeros(d * n_classes + n_classes)
+    if pesos_iniciais is not None:
+        w0, b0 = pesos_iniciais
+        theta0[:d * n_classes] = w0.ravel()
+        theta0[d * n_classes:] = b0
+    # histórico curto do L-BFGS: cada par guardado é do tamanho de todos os pesos
+    res = minimize(custo, theta0, jac=True, method="L-BFGS-B", options={"maxiter": max_iter, "maxcor": 5})
+    return res.x[:d * n_classes].reshape(d, n_classes), res.x[d * n_classes:]
+
+
+def prever(x: sp.csr_matrix, w: np.ndarray, b: np.ndarray):
+    """(classe, probabilidade) de cada linha, num produto esparso só."""
+    if x.shape[0] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    p = _softmax(np.asarray(x[:, :w.shape[0]] @ w) + b)
+    classe = p.argmax(axis=1)
+    return classe, p[np.arange(len(p)), classe]
+
+
+def pesos_para(w: np.ndarray, b: np.ndarray, classes_ant: list, classes: list,
+               termos_ant: np.ndarray, termos: np.ndarray):
+    """Pesos de um treino anterior no formato do novo (termos novos e classes novas começam em 0).
+
+    `termos_ant`/`termos`: ids (ordenados) das features de cada treino.
+    """
+    w0 = np.zeros((len(termos), len(classes)))
+    b0 = np.zeros(len(classes))
+    pos = np.minimum(np.searchsorted(termos_ant, termos), max(len(termos_ant) - 1, 0))
+    comum = np.flatnonzero(termos_ant[pos] == termos) if len(termos_ant) else np.empty(0, np.int64)
+    col_ant = {c: i for i, c in enumerate(classes_ant)}
+    for j, c in enumerate(classes):
+        if c in col_ant:
+            w0[comum, j] = w[pos[comum], col_ant[c]]
+            b0[j] = b[col_ant[c]]
+    return w0, b0
@@ -0,0 +1,197 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+import pyodbc
+
+# =========================================================
+# POOL DE CONEXÕES (compartilhado pelos painéis Dash)
+# =========================================================
+# - no máx. `tamanho` conexões abertas; quem passar disso espera na fila
+# - `max_consultas` limita quantas consultas rodam ao mesmo tempo no banco
+# - conexão parada há mais de `validar_apos_s` é testada (SELECT 1) antes de reusar
+# - se a conexão caiu no meio da consulta, descarta, reconecta e tenta 1x de novo
+
+CURSORES_POR_CONEXAO = 32   # statements preparados guardados por conexão (LRU)
+
+# SQLSTATEs de conexão perdida / link de comunicação
+_ERROS_CONEXAO = ("08S01", "08001", "08003", "08004", "08007", "HYT01")
+
+
+class PoolEsgotado(RuntimeError):
+    pass
+
+
+def _erro_de_conexao(exc: BaseException) -> bool:
+    # o pandas embrulha o erro do driver em DatabaseError: procura o pyodbc.Error na cadeia
+    while exc is not None:
+        if isinstance(exc, pyodbc.Error):
+            estado = exc.args[0] if exc.args else ""
+            if str(estado) == "HYT00":   # timeout da consulta: a conexão continua boa
+                return False
+            return isinstance(exc, pyodbc.OperationalError) or str(estado) in _ERROS_CONEXAO
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class PoolConexoes:
+    def __init__(
+        self,
+        conn_str: str,
+        tamanho: int = 4,
+        max_consultas: int = None,
+        timeout_consulta: int = 60,
+        timeout_login: int = 10,
+        timeout_espera: float = 30,
+        validar_apos_s: float = 30,
+    ):
+        self.conn_str = conn_str
+        self.tamanho = tamanho
+        self.timeout_consulta = timeout_consulta
+        self.timeout_login = timeout_login
+        self.timeout_espera = timeout_espera
+        self.validar_apos_s = validar_apos_s
+
+        self._livres = queue.LifoQueue()          # (conexão, último uso)
+        self._cursores = {}                       # id(conexão) -> {sql: cursor já preparado}
+        self._abertas = 0
+        self._lock = threading.Lock()
+        self._consultas = threading.BoundedSemaphore(max_consultas or tamanho)
+
+    # ---------- ciclo de vida das conexões ----------
+    def _abrir(self):
+        return pyodbc.connect(self.conn_str, timeout=self.timeout_login)
+
+    def _descartar(self, conn):
+        for cur in self._cursores.pop(id(conn), {}).values():
+            try:
+                cur.close()
+            except pyodbc.Error:
+                pass
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        with self._lock:
+            self._abertas -= 1
+
+    def _saudavel(self, conn) -> bool:
+        try:
+            conn.timeout = 5
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _pegar(self):
+        limite = time.monotonic() + self.timeout_espera
+        while True:
+            try:
+                conn, ultimo_uso = self._livres.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    pode_abrir = self._abertas < self.tamanho
+                    if pode_abrir:
+                        self._abertas += 1
+                if pode_abrir:
+                    try:
+                        return self._abrir()
+                    except pyodbc.Error:
+                        with self._lock:
+                            self._abertas -= 1
+                        raise
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise PoolEsgotado(f"nenhuma conexão livre em {self.timeout_espera}s")
+                try:
+                    conn, ultimo_uso = self._livres.get(timeout=restante)
+                except queue.Empty:
+                    continue
+
+            if time.monotonic() - ultimo_uso < self.validar_apos_s or self._saudavel(conn):
+                return conn
+            self._descartar(conn)
+
+    def _devolver(self, conn):
+        self._livres.put((conn, time.monotonic()))
+
+    @contextmanager
+    def conexao(self, timeout: int = None):
+        conn = self._pegar()
+        try:
+            conn.timeout = self.timeout_consulta if timeout is None else timeout
+            yield conn
+        except BaseException as exc:
+            if _erro_de_conexao(exc):
+                self._descartar(conn)
+            else:
+                self._devolver(conn)
+            raise
+        else:
+            self._devolver(conn)
+
+    def fechar(self):
+        while True:
+            try:
+                conn, _ = self._livres.get_nowait()
+            except queue.Empty:
+                return
+            self._descartar(conn)
+
+    # ---------- consultas ----------
+    def _ler_preparado(self, conn, query: str, params) -> pd.DataFrame:
+        # o pyodbc só re-prepara quando o SQL muda no mesmo cursor: 1 cursor por texto de SQL
+        cursores = self._cursores.setdefault(id(conn), OrderedDict())
+        cur = cursores.pop(query, None) or conn.cursor()
+        cursores[query] = cur
+        while len(cursores) > CURSORES_POR_CONEXAO:
+            cursores.popitem(last=False)[1].close()
+
+        cur.execute(query, params or [])
+        colunas = [c[0] for c in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=colunas, coerce_float=True)
+
+    def ler_sql(self, query: str, params=None, timeout: int = None, preparar=False) -> pd.DataFrame:
+        """pd.read_sql numa conexão do pool (timeout em segundos; reconecta 1x se a conexão caiu).
+
+        preparar=True reaproveita o statement preparado da última execução do mesmo SQL.
+        """
+        with self._consultas:
+            for tentativa in (1, 2):
+                try:
+                    with self.conexao(timeout) as conn:
+                        if preparar:
+                            return self._ler_preparado(conn, query, params)
+                        return pd.read_sql(query, conn, params=params)
+                except Exception as exc:
+                    if tentativa == 2 or not _erro_de_conexao(exc):
+                        raise
+
+
+# =========================================================
+# FILTROS -> WHERE PARAMETRIZADO (pushdown)
+# =========================================================
+def _tamanho_lista(n: int) -> int:
+    # 1, 2, 4, 8...: poucos textos de SQL distintos => plano/statement reaproveitado
+    return 1 << (n - 1).bit_length()
+
+def where_parametrizado(expressoes: dict, filtros: dict):
+    """Filtros da sidebar -> ("AND expr IN (?, ...)", params). Valor nunca entra no texto do SQL.
+
+    `expressoes` mapeia id do filtro -> expressão SQL fixa (definida no código, não pelo usuário).
+    """
+    partes, params = [], []
+    for fid, expr in expressoes.items():
+        vals = filtros.get(fid)
+        if isinstance(vals, str):
+            vals = [vals]
+        vals = sorted({str(v).strip() for v in (vals or [])})
+        if not vals:
+            continue
+        vals += [vals[-1]] * (_tamanho_lista(len(vals)) - len(vals))
+        partes.append(f"{expr} IN ({', '.join('?' * len(vals))})")
+        params += vals
+    return "".join(f"\n  AND {p}" for p in partes), params
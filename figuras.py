@@ -0,0 +1,222 @@
+from functools import lru_cache
+
+import numpy as np
+import plotly.io as pio
+
+# =========================================================
+# FIGURAS "DIRETAS" (dict do plotly montado à mão, sem plotly.express)
+# =========================================================
+# - o px gasta o tempo inspecionando o DataFrame e mesclando template; aqui já
+#   chegam os arrays agregados e sai o dict que o dcc.Graph entende
+# - mesmo visual do px (cores, hover, eixos, sizeref das bolhas)
+# - os esqueletos são montados 1x; as partes que não mudam são compartilhadas
+#   entre as figuras => não altere no lugar o dict devolvido
+
+COR_PADRAO = "#636efa"
+COR_FAIXA = "rgba(99, 110, 250, 0.15)"   # COR_PADRAO translúcida (intervalo de previsão)
+PALETA = list(pio.templates["plotly"].layout.colorway)
+
+_EIXO_X = {"anchor": "y", "domain": [0.0, 1.0]}
+_EIXO_Y = {"anchor": "x", "domain": [0.0, 1.0]}
+_LEGENDA = {"tracegroupgap": 0}
+_MARGEM_PX = {"t": 60}
+
+
+@lru_cache(maxsize=8)
+def _template(nome: str) -> dict:
+    return pio.templates[nome].to_plotly_json()
+
+
+def _mesclar(base: dict, extra: dict) -> dict:
+    """Cópia rasa de `base` com `extra` por cima (dicts aninhados são mesclados, não trocados)."""
+    out = dict(base)
+    for k, v in extra.items():
+        out[k] = _mesclar(out[k], v) if isinstance(v, dict) and isinstance(out.get(k), dict) else v
+    return out
+
+
+def _lista(a) -> list:
+    if getattr(a, "dtype", None) is not None and a.dtype.kind == "M":
+        # datas como texto ISO (serializar Timestamp 1 a 1 é o que fica caro)
+        return np.datetime_as_string(np.asarray(a, dtype="datetime64[s]"), unit="s").tolist()
+    return a.tolist() if hasattr(a, "tolist") else list(a)
+
+
+def _figura(traces: list, layout: dict, template: str = None, extra: dict = None) -> dict:
+    if extra:
+        layout = _mesclar(layout, extra)
+    if template:
+        layout = dict(layout, template=_template(template))
+    return {"data": traces, "layout": layout}
+
+
+def _layout_xy(titulo_x: str, titulo_y: str, **outros) -> dict:
+    return {
+        "xaxis": dict(_EIXO_X, title={"text": titulo_x}),
+        "yaxis": dict(_EIXO_Y, title={"text": titulo_y}),
+        "legend": _LEGENDA,
+        "margin": _MARGEM_PX,
+        **outros,
+    }
+
+
+# ---------- tipos de gráfico ----------
+def fig_barras(categorias, valores, nome_cat: str, nome_val: str, horizontal=False, texto=False,
+               template: str = None, trace: dict = None, layout: dict = None) -> dict:
+    """= px.bar(df, x=nome_cat, y=nome_val[, orientation="h"][, text=nome_val])."""
+    cat, val = _lista(categorias), _lista(valores)
+    eixo_val = "text" if texto else ("x" if horizontal else "y")
+    eixo_cat = "y" if horizontal else "x"
+    dica = f"{nome_val}=%{{{eixo_val}}}<br>{nome_cat}=%{{{eixo_cat}}}" if horizontal \
+        else f"{nome_cat}=%{{{eixo_cat}}}<br>{nome_val}=%{{{eixo_val}}}"
+    t = {
+        "type": "bar", "orientation": "h" if horizontal else "v",
+        "x": val if horizontal else cat, "y": cat if horizontal else val,
+        "marker": {"color": COR_PADRAO, "pattern": {"shape": ""}},
+        "hovertemplate": dica + "<extra></extra>",
+        "name": "", "legendgroup": "", "showlegend": False, "xaxis": "x", "yaxis": "y",
+    }
+    if texto:
+        t.update(text=val, textposition="auto")
+    if trace:
+        t = _mesclar(t, trace)
+    titulos = (nome_val, nome_cat) if horizontal else (nome_cat, nome_val)
+    return _figura([t], _layout_xy(*titulos, barmode="relative"), template, layout)
+
+
+def fig_pizza(nomes, valores, nome_cat: str, nome_val: str, hole=0.0,
+              template: str = None, layout: dict = None) -> dict:
+    """= px.pie(df, names=nome_cat, values=nome_val, hole=hole)."""
+    t = {
+        "type": "pie", "labels": _lista(nomes), "values": _lista(valores), "hole": hole,
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "hovertemplate": f"{nome_cat}=%{{label}}<br>{nome_val}=%{{value}}<extra></extra>",
+        "name": "", "legendgroup": "", "showlegend": True,
+    }
+    return _figura([t], {"legend": _LEGENDA, "margin": _MARGEM_PX}, template, layout)
+
+
+def fig_bolhas(categorias, valores, nome_cat: str, nome_val: str, size_max=20,
+               template: str = None, layout: dict = None) -> dict:
+    """= px.scatter(df, x=cat, y=val, size=val, color=cat, size_max) sem legenda: 1 trace, cor por ponto."""
+    cat, val = _lista(categorias), np.asarray(valores, dtype=float)
+    maior = float(val.max()) if len(val) else 0.0
+    t = {
+        "type": "scatter", "mode": "markers", "orientation": "v",
+        "x": cat, "y": val.tolist(),
+        "marker": {
+            "color": [PALETA[i % len(PALETA)] for i in range(len(cat))],
+            "size": val.tolist(), "sizemode": "area", "symbol": "circle",
+            "sizeref": 2.0 * maior / size_max ** 2 if maior > 0 else 1,
+        },
+        "hovertemplate": f"{nome_cat}=%{{x}}<br>{nome_val}=%{{marker.size}}<extra></extra>",
+        "name": "", "showlegend": False, "xaxis": "x", "yaxis": "y",
+    }
+    base = _layout_xy(nome_cat, nome_val)
+    base["xaxis"] = dict(base["xaxis"], categoryorder="array", categoryarray=cat)
+    return _figura([t], base, template, _mesclar({"showlegend": False}, layout or {}))
+
+
+def fig_area(x, y, nome_x: str, nome_y: str, template: str = None,
+             trace: dict = None, layout: dict = None) -> dict:
+    """= px.area(df, x=nome_x, y=nome_y)."""
+    t = {
+        "type": "scatter", "mode": "lines", "stackgroup": "1", "orientation": "v",
+        "x": _lista(x), "y": _lista(y),
+        "line": {"color": COR_PADRAO}, "marker": {"symbol": "circle"}, "fillpattern": {"shape": ""},
+        "hovertemplate": f"{nome_x}=%{{x}}<br>{nome_y}=%{{y}}<extra></extra>",
+        "name": "", "legendgroup": "", "showlegend": False, "xaxis": "x", "yaxis": "y",
+    }
+    if trace:
+        t = _mesclar(t, trace)
+    return _figura([t], _layout_xy(nome_x, nome_y), template, layout)
+
+
+def fig_linhas(x, series: dict, nome_x: str, nome_y: str, nome_cor: str,
+               template: str = None, layout: dict = None) -> dict:
+    """= px.line(df_longo, x=nome_x, y=nome_y, color=nome_cor): 1 trace por série, cores da paleta."""
+    xs = _lista(x)
+    traces = [
+        {
+            "type": "scatter", "mode": "lines", "orientation": "v",
+            "x": xs, "y": _lista(y), "name": str(nome), "legendgroup": str(nome), "showlegend": True,
+            "line": {"color": PALETA[i % len(PALETA)], "dash": "solid"}, "marker": {"symbol": "circle"},
+            "hovertemplate": f"{nome_cor}={nome}<br>{nome_x}=%{{x}}<br>{nome_y}=%{{y}}<extra></extra>",
+            "xaxis": "x", "yaxis": "y",
+        }
+        for i, (nome, y) in enumerate(series.items())
+    ]
+    base = _layout_xy(nome_x, nome_y, legend=dict(_LEGENDA, title={"text": nome_cor}))
+    return _figura(traces, base, template, layout)
+
+
+def com_faixa(fig: dict, x, media, inferior, superior, nome: str) -> dict:
+    """Nova figura = `fig` + linha tracejada da média e faixa sombreada entre inferior e superior.
+
+    Sem limites (inferior/superior None) sai só a linha da média.
+    """
+    xs = _lista(x)
+    comum = {"type": "scatter", "mode": "lines", "x": xs, "legendgroup": nome, "xaxis": "x", "yaxis": "y"}
+    faixa = [] if inferior is None else [
+        dict(comum, y=_lista(inferior), line={"width": 0}, showlegend=False, hoverinfo="skip", name=nome),
+        dict(comum, y=_lista(superior), line={"width": 0}, showlegend=False, hoverinfo="skip", name=nome,
+             fill="tonexty", fillcolor=COR_FAIXA),
+    ]
+    faixa += [
+        dict(comum, y=_lista(media), mode="lines+markers", name=nome, showlegend=True,
+             line={"color": COR_PADRAO, "dash": "dash"}, marker={"symbol": "circle-open"},
+             hovertemplate=f"{nome}=%{{y:.0f}}<extra></extra>"),
+    ]
+    return dict(fig, data=fig["data"] + faixa)
+
+
+# ---------- comparação px x direto ----------
+if __name__ == "__main__":
+    import json
+    import timeit
+
+    import pandas as pd
+    import plotly.express as px
+
+    rng = np.random.default_rng(0)
+    cats = pd.DataFrame({"Grupo": [f"Grupo {i}" for i in range(20)], "QTD": rng.integers(1, 500, 20)})
+    per = pd.DataFrame({"PERIODO": pd.date_range("2022-01-01", periods=36, freq="MS"), "QTD": rng.integers(1, 99, 36)})
+
+    casos = {
+        "barra": (
+            lambda: px.bar(cats, x="Grupo", y="QTD", text="QTD").to_plotly_json(),
+            lambda: fig_barras(cats["Grupo"], cats["QTD"], "Grupo", "QTD", texto=True, template="plotly"),
+        ),
+        "barra_h": (
+            lambda: px.bar(cats, x="QTD", y="Grupo", orientation="h").to_plotly_json(),
+            lambda: fig_barras(cats["Grupo"], cats["QTD"], "Grupo", "QTD", horizontal=True, template="plotly"),
+        ),
+        "pizza": (
+            lambda: px.pie(cats, names="Grupo", values="QTD", hole=0.6).to_plotly_json(),
+            lambda: fig_pizza(cats["Grupo"], cats["QTD"], "Grupo", "QTD", hole=0.6, template="plotly"),
+        ),
+        "bolhas": (
+            lambda: px.scatter(cats, x="Grupo", y="QTD", size="QTD", color="Grupo", size_max=30).to_plotly_json(),
+            lambda: fig_bolhas(cats["Grupo"], cats["QTD"], "Grupo", "QTD", size_max=30, template="plotly"),
+        ),
+        "area": (
+            lambda: px.area(per, x="PERIODO", y="QTD").to_plotly_json(),
+            lambda: fig_area(per["PERIODO"], per["QTD"], "PERIODO", "QTD", template="plotly"),
+        ),
+    }
+
+    # tempo = montar + serializar (é o que o callback paga até a resposta sair)
+    print(f"{'gráfico':<10}{'px (ms)':>10}{'direto (ms)':>14}{'x':>8}{'JSON px/direto (KB)':>24}")
+    for nome, (com_px, direto) in casos.items():
+        n = 30
+        t_px = timeit.timeit(lambda: pio.json.to_json_plotly(com_px()), number=n) / n * 1000
+        t_dir = timeit.timeit(lambda: pio.json.to_json_plotly(direto()), number=n) / n * 1000
+        kb_px = len(pio.json.to_json_plotly(com_px())) / 1024
+        kb_dir = len(pio.json.to_json_plotly(direto())) / 1024
+        print(f"{nome:<10}{t_px:>10.2f}{t_dir:>14.3f}{t_px / t_dir:>8.0f}{kb_px:>14.1f} / {kb_dir:.1f}")
+
+    # conferência: mesmos tipos de trace e mesmos valores nos eixos
+    for nome, (com_px, direto) in casos.items():
+        a, b = json.loads(pio.json.to_json_plotly(com_px())), json.loads(pio.json.to_json_plotly(direto()))
+        assert a["data"][0]["type"] == b["data"][0]["type"], nome
+        assert a["layout"]["template"] == b["layout"]["template"], nome
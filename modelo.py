@@ -1,12 +1,13 @@
 import pandas as pd
 import numpy as np
 
-from dash import Dash, html, dcc, dash_table
+from dash import Dash, html, dcc, dash_table, no_update
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
-import plotly.express as px
 
-import pyodbc
+from agendador import Agendador, DadosVersionados, impressao
+from conexao import PoolConexoes
+from figuras import fig_area, fig_barras, fig_bolhas, fig_pizza
 
 # =========================================================
 # 0) CONFIG / CONSTANTES
@@ -14,7 +15,10 @@ import pyodbc
 BOOTSTRAP_ICONS = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.css"
 
 APP_TITLE = "Template Dash - Compasa"
-REFRESH_MS = 2 * 60 * 1000   # 2 min
+REFRESH_S = 2 * 60           # agendador no servidor: 1 consulta a cada 2 min, para todas as abas
+REFRESH_JITTER_S = 15
+VERSAO_CHECK_MS = 15 * 1000  # as abas só conferem a versão dos dados
+TEMPLATE_FIGURAS = "plotly"  # mesmo template padrão que o px usava
 
 # --- estilos do tema (mantém seu visual) ---
 PAGE_STYLE = {"padding": "12px", "backgroundColor": "#a5aeb8", "minHeight": "100vh"}
@@ -54,13 +58,14 @@ TABLE_CELL_STYLE = {
 # =========================================================
 # 1) CONEXÃO / QUERY (troque aqui quando for outro projeto)
 # =========================================================
-conn = pyodbc.connect(
+CONN_STR = (
     "DRIVER={ODBC Driver 17 for SQL Server};"
     "SERVER=192.168.0.244,1433;"
     "DATABASE=FLUIG_COMPASA;"
     "UID=consulta;"
     "PWD=G@l@t@s2:20;"
 )
+db = PoolConexoes(CONN_STR, tamanho=4)
 
 sql_query = """
 -- troque por sua query
@@ -147,7 +152,7 @@ def card_com_header(titulo, graph_id):
 # 3) DATA LAYER (troque aqui por cache/ETL se quiser)
 # =========================================================
 def get_data() -> pd.DataFrame:
-    df = pd.read_sql(sql_query, conn)
+    df = db.ler_sql(sql_query)
     return df
 
 def preparar_campos(dff: pd.DataFrame) -> pd.DataFrame:
@@ -165,17 +170,14 @@ def preparar_campos(dff: pd.DataFrame) -> pd.DataFrame:
 def build_figures(dff: pd.DataFrame):
     # Status
     st = count_df(dff, "STATUS", "STATUS")
-    fig_status = px.bar(st, x="STATUS", y="QTD")
-    fig_status.update_layout(title=None)
+    fig_status = fig_barras(st["STATUS"], st["QTD"], "STATUS", "QTD", template=TEMPLATE_FIGURAS)
 
     # Impacto (se existir)
     if "lb_impacto" in dff.columns:
         imp = count_df(dff, "lb_impacto", "Impacto")
-        fig_impacto = px.pie(imp, names="Impacto", values="QTD", hole=0.6)
-        fig_impacto.update_layout(title=None)
+        fig_impacto = fig_pizza(imp["Impacto"], imp["QTD"], "Impacto", "QTD", hole=0.6, template=TEMPLATE_FIGURAS)
     else:
-        fig_impacto = px.pie(pd.DataFrame({"Impacto": ["N/I"], "QTD": [1]}), names="Impacto", values="QTD", hole=0.6)
-        fig_impacto.update_layout(title=None)
+        fig_impacto = fig_pizza(["N/I"], [1], "Impacto", "QTD", hole=0.6, template=TEMPLATE_FIGURAS)
 
     # Técnico
     tec_all = count_df(dff, "nm_tecAtual", "Técnico").sort_values("QTD", ascending=False)
@@ -183,17 +185,17 @@ def build_figures(dff: pd.DataFrame):
     outros_qtd = tec_all["QTD"].iloc[15:].sum() if len(tec_all) > 15 else 0
     if outros_qtd > 0:
         top15 = pd.concat([top15, pd.DataFrame([{"Técnico": "OUTROS", "QTD": outros_qtd}])], ignore_index=True)
-    fig_tecnico = px.bar(top15, x="QTD", y="Técnico", orientation="h", text="QTD")
-    fig_tecnico.update_layout(title=None, yaxis={"categoryorder": "total ascending"}, margin=dict(l=10, r=10, t=10, b=10))
+    fig_tecnico = fig_barras(
+        top15["Técnico"], top15["QTD"], "Técnico", "QTD", horizontal=True, texto=True, template=TEMPLATE_FIGURAS,
+        layout={"yaxis": {"categoryorder": "total ascending"}, "margin": dict(l=10, r=10, t=10, b=10)},
+    )
 
     # Grupo/Subgrupo
     in1 = count_df(dff, "input1", "Grupo").sort_values("QTD", ascending=False).head(15)
-    fig_in1 = px.scatter(in1, x="Grupo", y="QTD", size="QTD", color="Grupo", size_max=30)
-    fig_in1.update_layout(showlegend=False, title=None)
+    fig_in1 = fig_bolhas(in1["Grupo"], in1["QTD"], "Grupo", "QTD", size_max=30, template=TEMPLATE_FIGURAS)
 
     in2 = count_df(dff, "input2", "Subgrupo").sort_values("QTD", ascending=False).head(20)
-    fig_in2 = px.scatter(in2, x="Subgrupo", y="QTD", size="QTD", color="Subgrupo", size_max=30)
-    fig_in2.update_layout(showlegend=False, title=None)
+    fig_in2 = fig_bolhas(in2["Subgrupo"], in2["QTD"], "Subgrupo", "QTD", size_max=30, template=TEMPLATE_FIGURAS)
 
     # Período (área suavizada + pontos)
     if "dt_emissao" in dff.columns:
@@ -203,9 +205,11 @@ def build_figures(dff: pd.DataFrame):
     else:
         df_periodo = pd.DataFrame({"PERIODO": [pd.Timestamp.today().normalize()], "QTD": [0]})
 
-    fig_periodo = px.area(df_periodo, x="PERIODO", y="QTD")
-    fig_periodo.update_traces(mode="lines+markers", line_shape="spline", marker=dict(size=8), line=dict(width=2))
-    fig_periodo.update_layout(title=None, xaxis_title="Período", yaxis_title="Quantidade", hovermode="x unified")
+    fig_periodo = fig_area(
+        df_periodo["PERIODO"], df_periodo["QTD"], "PERIODO", "QTD", template=TEMPLATE_FIGURAS,
+        trace={"mode": "lines+markers", "line": {"shape": "spline", "width": 2}, "marker": {"size": 8}},
+        layout={"xaxis": {"title": {"text": "Período"}}, "yaxis": {"title": {"text": "Quantidade"}}, "hovermode": "x unified"},
+    )
 
     # Solicitante
     sol = (
@@ -219,15 +223,22 @@ def build_figures(dff: pd.DataFrame):
     )
     sol.columns = ["Solicitante", "QTD"]
     top15_sol = sol.sort_values("QTD", ascending=False).head(15)
-    fig_solicitante = px.bar(top15_sol, x="Solicitante", y="QTD", text="QTD")
-    fig_solicitante.update_layout(title=None, xaxis_tickangle=-45)
+    fig_solicitante = fig_barras(
+        top15_sol["Solicitante"], top15_sol["QTD"], "Solicitante", "QTD", texto=True, template=TEMPLATE_FIGURAS,
+        layout={"xaxis": {"tickangle": -45}},
+    )
 
     return fig_status, fig_impacto, fig_tecnico, fig_in1, fig_in2, fig_periodo, fig_solicitante
 
 # =========================================================
 # 5) BUILD FILTER OPTIONS (1x no boot)
 # =========================================================
-df0 = preparar_campos(get_data())
+# fonte única: o agendador recarrega em segundo plano e a versão só sobe quando os dados mudam
+dados = DadosVersionados(lambda: preparar_campos(get_data()))
+dados.atualizar()
+agendador = Agendador("modelo", dados.atualizar, REFRESH_S, REFRESH_JITTER_S).iniciar()
+
+df0 = dados.dados
 
 options_solicitante = opts_from_series(df0.get("nome_solicitante"))
 options_mes = opts_from_series(df0.get("MES_EMISSAO"))
@@ -370,7 +381,9 @@ app.layout = dbc.Container(
     children=[
         dcc.Store(id="sidebar_state", data={"open": True}),
         dcc.Download(id="download_xlsx"),
-        dcc.Interval(id="interval_refresh", interval=REFRESH_MS, n_intervals=0),
+        dcc.Interval(id="interval_refresh", interval=VERSAO_CHECK_MS, n_intervals=0),
+        dcc.Store(id="store_versao", data=dados.versao),
+        dcc.Store(id="store_impressao"),
         dbc.Row(
             [
                 dbc.Col(sidebar, id="col_sidebar", width=2),
@@ -400,6 +413,16 @@ def toggle_sidebar(n, st):
     col_main = 9 if is_open else 12
     return is_open, col_sidebar, col_main, {"open": is_open}
 
+# o intervalo só confere a versão; update_all roda quando ela muda (ou quando um filtro muda)
+@app.callback(
+    Output("store_versao", "data"),
+    Input("interval_refresh", "n_intervals"),
+    State("store_versao", "data"),
+    prevent_initial_call=True,
+)
+def checar_versao(n_intervals, versao_atual):
+    return no_update if dados.versao == versao_atual else dados.versao
+
 @app.callback(
     Output("kpi_total", "children"),
     Output("kpi_media", "children"),
@@ -414,16 +437,18 @@ def toggle_sidebar(n, st):
     Output("g_solicitante", "figure"),
     Output("tbl", "data"),
     Output("tbl", "columns"),
-    Input("interval_refresh", "n_intervals"),
+    Output("store_impressao", "data"),
+    Input("store_versao", "data"),
     Input("f_solicitante", "value"),
     Input("f_mes_emissao", "value"),
     Input("f_status", "value"),
     Input("f_tecnico", "value"),
     Input("f_input1", "value"),
     Input("f_input2", "value"),
+    State("store_impressao", "data"),
 )
-def update_all(n_intervals, f_solicitante, f_mes, f_status, f_tecnico, f_in1, f_in2):
-    dff = preparar_campos(get_data())
+def update_all(versao, f_solicitante, f_mes, f_status, f_tecnico, f_in1, f_in2, impressao_anterior):
+    dff = dados.dados   # filtros abaixo geram cópias; o df compartilhado não é alterado
 
     # filtros (padrão template)
     if f_solicitante:
@@ -441,6 +466,11 @@ def update_all(n_intervals, f_solicitante, f_mes, f_status, f_tecnico, f_in1, f_
     if f_in2 and "input2" in dff.columns:
         dff = dff[dff["input2"].astype(str).isin([str(x) for x in f_in2])]
 
+    # as saídas só dependem das linhas filtradas: mesmas linhas do último envio => nada a mandar
+    atual = impressao(dff)
+    if atual == impressao_anterior:
+        return (no_update,) * 14
+
     # KPIs (exemplo)
     total = len(dff)
     meses_distintos = int(dff["MES_EMISSAO"].dropna().nunique()) if "MES_EMISSAO" in dff.columns else 0
@@ -463,7 +493,7 @@ def update_all(n_intervals, f_solicitante, f_mes, f_status, f_tecnico, f_in1, f_
     data = view.to_dict("records")
     columns = [{"name": c, "id": c} for c in view.columns]
 
-    return k1, k2, k3, k4, fig_status, fig_impacto, fig_tecnico, fig_in1, fig_in2, fig_periodo, fig_solicitante, data, columns
+    return k1, k2, k3, k4, fig_status, fig_impacto, fig_tecnico, fig_in1, fig_in2, fig_periodo, fig_solicitante, data, columns, atual
 
 @app.callback(
     Output("download_xlsx", "data"),
@@ -0,0 +1,98 @@
+import numpy as np
+import scipy.sparse as sp
+
+# =========================================================
+# QUANTIS APROXIMADOS MESCLÁVEIS (sketch de histograma logarítmico, estilo DDSketch)
+# =========================================================
+# - cada valor cai num balde de largura relativa fixa: o quantil sai com erro relativo <= ALFA
+# - o sketch é só um vetor de contagens por balde: juntar 2 sketches = somar os vetores
+#   (por isso dá p/ guardar 1 por célula do cubo e combinar qualquer filtro depois)
+# - vários sketches = matriz esparsa (linha = célula, coluna = balde); soma de linhas é barata
+
+ALFA = 0.02                      # erro relativo máximo do quantil (2%)
+VALOR_MIN = 0.05                 # abaixo disso vai p/ o balde 0 (representa 0)
+VALOR_MAX = 1e6
+
+_GAMA = (1 + ALFA) / (1 - ALFA)
+_LOG_GAMA = np.log(_GAMA)
+_OFFSET = int(np.floor(np.log(VALOR_MIN) / _LOG_GAMA))
+N_BALDES = int(np.ceil(np.log(VALOR_MAX) / _LOG_GAMA)) - _OFFSET + 1
+
+# valor que representa cada balde (ponto que deixa o erro relativo simétrico); balde 0 = 0
+_REPRESENTANTE = np.concatenate([
+    [0.0],
+    2 * _GAMA ** np.arange(_OFFSET + 1, _OFFSET + N_BALDES) / (_GAMA + 1),
+])
+
+
+def baldes(valores) -> np.ndarray:
+    """Índice do balde de cada valor (NaN/negativo/pequeno => 0)."""
+    v = np.asarray(valores, dtype=float)
+    out = np.zeros(len(v), dtype=np.int32)
+    ok = v > VALOR_MIN
+    out[ok] = np.clip(np.ceil(np.log(v[ok]) / _LOG_GAMA).astype(np.int64) - _OFFSET, 1, N_BALDES - 1)
+    return out
+
+
+def matriz_sketches(grupos: np.ndarray, valores, n_grupos: int) -> sp.csr_matrix:
+    """1 sketch por grupo (linha), a partir do grupo e do valor de cada observação."""
+    grupos = np.asarray(grupos, dtype=np.int64)
+    uns = np.ones(len(grupos), dtype=np.int64)
+    return sp.csr_matrix((uns, (grupos, baldes(valores))), shape=(n_grupos, N_BALDES))
+
+
+def mesclar_por(sketches: sp.csr_matrix, chaves: np.ndarray, n_chaves: int) -> np.ndarray:
+    """Soma as linhas com a mesma chave: (n_chaves x N_BALDES) denso."""
+    chaves = np.asarray(chaves, dtype=np.int64)
+    juntar = sp.csr_matrix(
+        (np.ones(len(chaves), dtype=np.int64), (chaves, np.arange(len(chaves)))),
+        shape=(n_chaves, len(chaves)),
+    )
+    return (juntar @ sketches).toarray()
+
+
+def quantis(contagens: np.ndarray, qs=(0.5, 0.9, 0.95)) -> np.ndarray:
+    """Quantis de cada linha de contagens (k x N_BALDES) => (k x len(qs)); linha vazia => NaN."""
+    contagens = np.atleast_2d(contagens)
+    acum = np.cumsum(contagens, axis=1)
+    total = acum[:, -1:]
+    out = np.full((len(contagens), len(qs)), np.nan)
+    for j, q in enumerate(qs):
+        # posição do q-ésimo valor (1-based) => 1º balde cujo acumulado o alcança
+        alvo = np.floor(q * np.maximum(total - 1, 0)) + 1
+        b = (acum < alvo).sum(axis=1)
+        out[:, j] = _REPRESENTANTE[np.minimum(b, N_BALDES - 1)]
+    out[total[:, 0] == 0] = np.nan
+    return out
+
+
+# ---------- conferência contra o quantil exato ----------
+if __name__ == "__main__":
+    import timeit
+
+    rng = np.random.default_rng(0)
+    valores = np.round(rng.lognormal(3, 1.5, 200_000), 1)
+    grupos = rng.integers(0, 5000, len(valores))
+
+    sk = matriz_sketches(grupos, valores, 5000)
+    aprox = quantis(np.asarray(sk.sum(axis=0)))[0]
+    exato = np.quantile(valores, [0.5, 0.9, 0.95], method="lower")
+    print("aprox", np.round(aprox, 2), "exato", exato, "erro rel.", np.round(np.abs(aprox / exato - 1), 4))
+
+    # finalizados x cancelados: o cancelado tem END_DATE, mas o SLA do painel conta até agora
+    # (preparar_campos); o sketch dos finalizados tem de sair só de STATUS == "FINALIZADO"
+    status = rng.choice(np.array(["FINALIZADO", "CANCELADO", "ATIVO"]), len(valores), p=[0.7, 0.2, 0.1])
+    sla = np.where(status == "FINALIZADO", valores, valores + rng.uniform(2000, 8000, len(valores)))
+    fechado = status == "FINALIZADO"
+    sk = matriz_sketches(grupos[fechado], sla[fechado], 5000)
+    aprox = quantis(np.asarray(sk.sum(axis=0)))[0]
+    exato = np.quantile(sla[fechado], [0.5, 0.9, 0.95], method="lower")
+    erro = np.abs(aprox / exato - 1)
+    print("só finalizados: aprox", np.round(aprox, 2), "exato", exato, "erro rel.", np.round(erro, 4))
+    assert (erro <= ALFA + 1e-9).all(), erro
+    com_cancelados = quantis(np.asarray(matriz_sketches(grupos[status != "ATIVO"], sla[status != "ATIVO"], 5000).sum(axis=0)))[0]
+    assert com_cancelados[2] > 10 * exato[2], "cancelados deveriam distorcer o p95 (cenário do teste)"
+
+    chaves = np.arange(5000) % 40   # 5000 células => 40 grupos (ex.: técnicos)
+    t = timeit.timeit(lambda: quantis(mesclar_por(sk, chaves, 40)), number=20) / 20 * 1000
+    print(f"mesclar 5000 sketches em 40 grupos + quantis: {t:.2f} ms")